@@ -0,0 +1,23 @@
+"""Unguessable bearer tokens for data that has no login in front of it.
+
+Whoever holds a token can read and change what it keys (a ledger, a chat
+history), so a token is random rather than a name someone could type, and
+stores only ever see token_key(token), a hash of it.
+"""
+import hashlib
+import re
+import secrets
+
+# token_urlsafe(32): 43 characters, 256 bits
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_-]{43}")
+
+
+def new_token():
+    return secrets.token_urlsafe(32)
+
+
+def token_key(token):
+    """The storage key for a token, or None if it isn't one new_token() could make."""
+    if not isinstance(token, str) or not _TOKEN_RE.fullmatch(token):
+        return None
+    return hashlib.sha256(token.encode("ascii")).hexdigest()
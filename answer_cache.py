@@ -0,0 +1,184 @@
+"""Answer cache for free-form questions that also matches rephrasings.
+
+A question is reduced to its content words (stop words dropped, words cut to
+a five-letter stem, so "How do I reduce..." and "Tips to reducing..." agree)
+and then to the set of character trigrams of those words. A MinHash signature
+of the set is split into bands, and every band is a key in an in-memory
+index, so a lookup only compares the new question with cached ones that
+share a band. Those candidates are scored by exact Jaccard similarity of
+their trigram sets, and the best one at or above `threshold` is returned.
+Questions whose numbers differ ("save $500" vs "save $5000") never match.
+"""
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+_WORD_RE = re.compile(r"[\w$€£₹%./]+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,/]\d+)*")
+
+# Words that change the phrasing of a finance question but not what it asks
+STOP_WORDS = frozenset(
+    "a about am an and any are at be can could did do does each for how i in is it its me much my of "
+    "on or our per please should some tell that the there this to we what whats which will with would "
+    "you your".split())
+
+# Mersenne prime for the (a * x + b) mod p permutation family
+_PRIME = (1 << 61) - 1
+
+
+def normalize_question(question):
+    """The question's content words, stemmed, in order; "" if it has none."""
+    words = []
+    for word in _WORD_RE.findall(question.casefold().replace("'", "").replace("\u2019", "")):
+        word = word.strip(".,/")
+        if not word or word in STOP_WORDS:
+            continue
+        words.append(word if any(c.isdigit() for c in word) else word[:5])
+    return " ".join(words)
+
+
+def shingles(text, size=3):
+    """Hashed character n-grams of a normalized question."""
+    padded = f" {text} "
+    return {zlib.crc32(padded[i:i + size].encode()) for i in range(max(1, len(padded) - size + 1))}
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class _Entry:
+    __slots__ = ("key", "shingles", "numbers", "answer", "expires_at", "bands")
+
+    def __init__(self, key, shingles, numbers, answer, expires_at, bands):
+        self.key = key
+        self.shingles = shingles
+        self.numbers = numbers
+        self.answer = answer
+        self.expires_at = expires_at
+        self.bands = bands
+
+
+class AnswerCache:
+    """LRU cache of answers with a TTL, looked up by question similarity.
+
+    `threshold` is the minimum Jaccard similarity of trigram sets for a
+    cached answer to be reused (1.0 means exact matches only). The MinHash
+    signature has `bands` * `rows` values; more rows per band means fewer,
+    closer candidates per lookup.
+    """
+
+    def __init__(self, max_entries=1000, ttl=86400, threshold=0.75, bands=16, rows=2, seed=1):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        # Fixed seed, so every worker process builds the same signatures
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(bands * rows)]
+        self._entries = OrderedDict()
+        self._index = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def _band_keys(self, hashes):
+        signature = [min((a * x + b) % _PRIME for x in hashes) for a, b in self._perms]
+        return [(band, tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def _drop(self, entry):
+        """Removes an entry from the cache and the index; caller must hold the lock."""
+        del self._entries[entry.key]
+        for band_key in entry.bands:
+            keys = self._index.get(band_key)
+            if keys is not None:
+                keys.discard(entry.key)
+                if not keys:
+                    del self._index[band_key]
+
+    def get(self, question):
+        """Returns the cached answer to this question or a close rephrasing of it, or None."""
+        key = normalize_question(question)
+        if not key:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._drop(entry)
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry.answer
+            if self.threshold >= 1.0 or not self._entries:
+                self._stats["misses"] += 1
+                return None
+
+        hashes = shingles(key)
+        numbers = frozenset(_NUMBER_RE.findall(key))
+        band_keys = self._band_keys(hashes)
+        with self._lock:
+            candidates = set()
+            for band_key in band_keys:
+                candidates.update(self._index.get(band_key, ()))
+            best, best_score = None, self.threshold
+            for candidate in candidates:
+                entry = self._entries[candidate]
+                if entry.expires_at <= now:
+                    self._drop(entry)
+                    self._stats["expirations"] += 1
+                    continue
+                if entry.numbers != numbers:
+                    continue
+                score = jaccard(hashes, entry.shingles)
+                if score >= best_score:
+                    best, best_score = entry, score
+            if best is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best.key)
+            self._stats["hits"] += 1
+            self._stats["near_hits"] += 1
+            return best.answer
+
+    def set(self, question, answer):
+        """Caches an answer under the normalized question."""
+        key = normalize_question(question)
+        if not key:
+            return
+        hashes = shingles(key)
+        entry = _Entry(key, hashes, frozenset(_NUMBER_RE.findall(key)), answer, time.time() + self.ttl,
+                       self._band_keys(hashes))
+        with self._lock:
+            if key in self._entries:
+                self._drop(self._entries[key])
+            self._entries[key] = entry
+            for band_key in entry.bands:
+                self._index.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries.values())))
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and the current size."""
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), max_entries=self.max_entries,
+                         threshold=self.threshold)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def answer_cache_from_env():
+    """Builds the answer cache from SMARTSPEND_ANSWER_CACHE_SIZE, _TTL and _SIMILARITY."""
+    return AnswerCache(
+        max_entries=int(os.environ.get("SMARTSPEND_ANSWER_CACHE_SIZE", "1000")),
+        ttl=int(os.environ.get("SMARTSPEND_ANSWER_CACHE_TTL", str(24 * 3600))),
+        threshold=float(os.environ.get("SMARTSPEND_ANSWER_CACHE_SIMILARITY", "0.75"))
+    )
@@ -1,8 +1,12 @@
 import streamlit as st
-import requests
 import os
 from dotenv import load_dotenv
 from flask_cors import CORS
+from categorization_engine import default_engine
+from category_cache import cache_from_env
+from local_model import load_model
+from merchant_dict import load_merchant_dict
+from mistral_client import get_client
 
 # Load environment variables from .env file if it exists
 load_dotenv()
@@ -18,94 +22,32 @@ if not MISTRAL_API_KEY:
     st.error("MISTRAL_API_KEY not set. Please set it in environment variables or Streamlit secrets.")
     st.stop()
 
-MISTRAL_ENDPOINT = "https://api.mistral.ai/v1/chat/completions"
-HEADERS = {
-    "Authorization": f"Bearer {MISTRAL_API_KEY}",
-    "Content-Type": "application/json"
-}
+client = get_client(MISTRAL_API_KEY)
 
-def get_category_from_mistral(description):
-    """Calls Mistral AI API to categorize an expense description."""
-    try:
-        payload = {
-            "model": "mistral-tiny",
-            "messages": [
-                {"role": "system", "content": "You are an expense categorization assistant. Categorize expenses into one of these categories: food, transportation, housing, utilities, entertainment, shopping, travel, health, education, or other. Reply with just the category name in lowercase."},
-                {"role": "user", "content": f"Categorize this expense: {description}"}
-            ],
-            "temperature": 0.3
-        }
-        response = requests.post(MISTRAL_ENDPOINT, json=payload, headers=HEADERS, timeout=10)
-        response.raise_for_status()
+@st.cache_resource
+def load_engine(api_key):
+    """The shared categorization chain (cache, rules, merchants, local model, Mistral), built once per process."""
+    return default_engine(get_client(api_key).categorize, cache_from_env(), load_model(),
+                          merchants=load_merchant_dict())
 
-        response_data = response.json()
-        if "choices" in response_data and response_data["choices"]:
-            category = response_data["choices"][0].get("message", {}).get("content", "other").strip().lower()
-            common_categories = ["food", "transportation", "housing", "utilities", "entertainment", 
-                               "shopping", "travel", "health", "education", "other"]
-            for c in common_categories:
-                if c in category:
-                    return c
-            return "other"
-        st.write("No valid choices in response:", response_data)
-        return "other"
-    except requests.exceptions.Timeout:
-        st.error("Request to Mistral API timed out.")
-        return "other"
-    except requests.exceptions.HTTPError as e:
-        st.error(f"HTTP error: {e.response.status_code}")
-        return "other"
-    except Exception as e:
-        st.error(f"Error: {str(e)}")
-        return "other"
+def get_category_from_mistral(description):
+    """Categorizes an expense, asking Mistral only when the local tiers can't."""
+    category, source, reason = load_engine(MISTRAL_API_KEY).categorize(description)
+    if reason:
+        st.warning(f"Mistral unavailable ({reason}). Using local categorization.")
+    return category
 
 def get_query_response(query):
     """Handles general queries via Mistral API."""
     try:
-        payload = {
-            "model": "mistral-tiny",
-            "messages": [
-                {"role": "system", "content": "You are an expense management assistant. Provide helpful, concise responses about expense categories, finance management, and budgeting."},
-                {"role": "user", "content": query}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 150
-        }
-        response = requests.post(MISTRAL_ENDPOINT, json=payload, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-
-        response_data = response.json()
-        if "choices" in response_data and response_data["choices"]:
-            return response_data["choices"][0].get("message", {}).get("content", "").strip()
+        answer = client.answer(query)
+        if answer is not None:
+            return answer
         return "I couldn't process your query. Please try again."
     except Exception as e:
         st.error(f"Error processing query: {e}")
         return "I'm having trouble connecting to my knowledge base. Please try again later."
 
-def get_default_category(description):
-    """Local fallback categorization when API is unavailable."""
-    desc = description.lower()
-    if "restaurant" in desc or "food" in desc or "dinner" in desc or "lunch" in desc or "breakfast" in desc or "coffee" in desc:
-        return "food"
-    elif "uber" in desc or "taxi" in desc or "bus" in desc or "train" in desc or "gas" in desc or "car" in desc:
-        return "transportation"
-    elif "rent" in desc or "mortgage" in desc or "home" in desc:
-        return "housing"
-    elif "electricity" in desc or "water" in desc or "bill" in desc or "internet" in desc or "phone" in desc:
-        return "utilities"
-    elif "movie" in desc or "netflix" in desc or "spotify" in desc or "concert" in desc or "game" in desc:
-        return "entertainment"
-    elif "amazon" in desc or "mall" in desc or "store" in desc or "buy" in desc or "purchase" in desc:
-        return "shopping"
-    elif "doctor" in desc or "medicine" in desc or "hospital" in desc or "health" in desc:
-        return "health"
-    elif "course" in desc or "book" in desc or "tuition" in desc or "class" in desc or "school" in desc:
-        return "education"
-    elif "hotel" in desc or "flight" in desc or "vacation" in desc or "trip" in desc or "travel" in desc:
-        return "travel" 
-    else:
-        return "other"
-
 # Main Streamlit UI
 def main():
     st.title("SmartSpend - Expense Categorization API")
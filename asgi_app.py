@@ -0,0 +1,234 @@
+"""Async serving mode for the SmartSpend API.
+
+Serves /api/categorize, /api/query, /api/query/stream and /api/status like
+main.py, but upstream calls go through an asyncio HTTP client so a single
+process can hold hundreds of slow Mistral requests at once.
+
+Run with: uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+"""
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from categorization_engine import AsyncLLMTier, CacheTier, CategorizationEngine, MerchantTier, ModelTier, RulesTier
+from answer_cache import answer_cache_from_env
+from category_cache import cache_from_env
+from local_model import load_model
+from merchant_dict import load_merchant_dict
+from mistral_client import AsyncMistralClient, get_client
+from upstream_health import prober_from_env
+from upstream_scheduler import is_throttled
+
+# Load environment variables from .env file if it exists
+load_dotenv()
+
+MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
+
+OFFLINE_MESSAGE = "I'm currently in offline mode. For financial advice, please make sure you're tracking your expenses regularly and categorizing them properly to understand your spending patterns."
+NO_ANSWER_MESSAGE = "I couldn't process your query. Please try again."
+UPSTREAM_ERROR_MESSAGE = "I'm having trouble connecting to my knowledge base. Please try again later."
+
+# Seconds /api/categorize waits for Mistral before answering from the local tiers
+LATENCY_BUDGET = float(os.environ.get("SMARTSPEND_LATENCY_BUDGET", "1.5"))
+
+category_cache = cache_from_env()
+
+# Answers to /api/query questions, reused for close rephrasings
+answer_cache = answer_cache_from_env()
+
+
+def probe_upstream():
+    """One probe request (run on the prober's thread); returns (ok, seconds)."""
+    start = time.perf_counter()
+    try:
+        ok = get_client(MISTRAL_API_KEY).ping()
+    except Exception as e:
+        if not is_throttled(e):
+            raise
+        # A 429 means Mistral is up and answering, just rate limiting us
+        return True, None
+    return ok, time.perf_counter() - start
+
+
+# Probes Mistral in a background thread; categorizations skip it while it looks unhealthy
+upstream_health = prober_from_env(probe_upstream)
+
+
+async def ask_mistral_category(description):
+    return await app.state.client.categorize(description)
+
+
+def upstream_unavailable():
+    """Why Mistral can't be asked right now, or None if it can."""
+    if not MISTRAL_API_KEY:
+        return 'offline'
+    return upstream_health.unavailable()
+
+
+# Same chain as main.py: cache, merchant dictionary, keyword rules, local model, then Mistral
+categorization_engine = CategorizationEngine([
+    CacheTier(category_cache),
+    MerchantTier(load_merchant_dict()),
+    RulesTier(),
+    ModelTier(load_model(), float(os.environ.get("SMARTSPEND_MODEL_CONFIDENCE", "0.9"))),
+    AsyncLLMTier(ask_mistral_category, available=upstream_unavailable,
+                 budget=LATENCY_BUDGET, cache=category_cache)
+])
+
+
+async def get_category_from_mistral(description):
+    """Categorizes an expense description; returns (category, source, reason)."""
+    return await categorization_engine.acategorize(description)
+
+
+async def get_query_response(client, query):
+    """Handles general queries via Mistral API."""
+
+    if client is None:
+        return OFFLINE_MESSAGE
+
+    cached = answer_cache.get(query)
+    if cached is not None:
+        return cached
+
+    try:
+        answer = await client.answer(query)
+        if answer is None:
+            return NO_ANSWER_MESSAGE
+        answer_cache.set(query, answer)
+        return answer
+    except Exception as e:
+        print(f"Error processing query: {str(e)}")
+        return UPSTREAM_ERROR_MESSAGE
+
+
+async def stream_query_response(client, query):
+    """Yields the answer to a query in pieces as Mistral generates it."""
+
+    if client is None:
+        yield OFFLINE_MESSAGE
+        return
+
+    cached = answer_cache.get(query)
+    if cached is not None:
+        yield cached
+        return
+
+    tokens = []
+    try:
+        async for token in client.stream_answer(query):
+            tokens.append(token)
+            yield token
+    except Exception as e:
+        print(f"Error streaming query: {str(e)}")
+        if not tokens:
+            yield UPSTREAM_ERROR_MESSAGE
+        return
+    if not tokens:
+        yield NO_ANSWER_MESSAGE
+        return
+    # Only complete answers are cached
+    answer_cache.set(query, "".join(tokens))
+
+
+async def read_json(request):
+    """Returns the JSON request body, or None if it is missing or malformed."""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def api_categorize(request):
+    data = await read_json(request)
+
+    if not isinstance(data, dict) or 'description' not in data:
+        return JSONResponse({'error': 'No expense description provided'}, status_code=400)
+    if not isinstance(data['description'], str):
+        return JSONResponse({'error': 'Description must be a string'}, status_code=400)
+
+    description = data['description']
+    category, source, reason = await get_category_from_mistral(description)
+
+    result = {
+        'category': category,
+        'description': description,
+        'source': source
+    }
+    if reason:
+        result['fallback_reason'] = reason
+    return JSONResponse(result)
+
+
+async def api_query(request):
+    data = await read_json(request)
+
+    if not isinstance(data, dict) or 'query' not in data:
+        return JSONResponse({'error': 'No query provided'}, status_code=400)
+
+    query = data['query']
+    response = await get_query_response(request.app.state.client, query)
+
+    return JSONResponse({
+        'response': response,
+        'query': query
+    })
+
+
+async def api_query_stream(request):
+    data = await read_json(request)
+
+    if not isinstance(data, dict) or 'query' not in data:
+        return JSONResponse({'error': 'No query provided'}, status_code=400)
+
+    query = data['query']
+
+    async def events():
+        async for token in stream_query_response(request.app.state.client, query):
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        yield f"event: done\ndata: {json.dumps({'query': query})}\n\n"
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+async def api_status(request):
+    return JSONResponse({
+        'status': 'online',
+        'api_available': bool(MISTRAL_API_KEY),
+        'upstream_healthy': bool(MISTRAL_API_KEY) and upstream_unavailable() is None,
+        'upstream_health': upstream_health.stats() if MISTRAL_API_KEY else None,
+        'cache': category_cache.stats(),
+        'answer_cache': answer_cache.stats(),
+        'categorization': categorization_engine.stats()
+    })
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # The client owns the connection pool, so it lives as long as the worker
+    app.state.client = AsyncMistralClient(MISTRAL_API_KEY) if MISTRAL_API_KEY else None
+    if MISTRAL_API_KEY:
+        upstream_health.start()
+    yield
+    if app.state.client is not None:
+        await app.state.client.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/categorize', api_categorize, methods=['POST']),
+        Route('/api/query', api_query, methods=['POST']),
+        Route('/api/query/stream', api_query_stream, methods=['POST']),
+        Route('/api/status', api_status, methods=['GET']),
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,165 @@
+"""Fingerprinted, precompressed static assets.
+
+build() copies every file in static/ to static/build/ under a content-hashed
+name ("style.css" -> "style.1a2b3c4d5e6f.css") next to .gz and, when the
+brotli package is installed, .br copies, and writes a manifest.json mapping
+source names to built ones. Since a built name changes whenever its content
+does, those files can be cached by browsers and proxies forever.
+
+Run `python assets.py` at deploy time (e.g. when static/ is read-only at
+runtime); otherwise the server builds whatever is missing when it starts.
+Either way, built files the new manifest doesn't list are deleted, so old
+fingerprints don't pile up.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # .br files are skipped without it
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, "static")
+BUILD_DIR_NAME = "build"
+MANIFEST_NAME = "manifest.json"
+
+# Only text formats are worth compressing; images and fonts already are
+COMPRESSIBLE = (".css", ".js", ".json", ".svg", ".html", ".txt", ".map")
+
+# Preferred first when the client accepts several
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def fingerprinted_name(name, digest):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+def compress(data, encoding):
+    if encoding == "gzip":
+        # mtime=0, so rebuilding the same file produces the same bytes
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+
+def prune(build_dir, keep):
+    """Deletes files in `build_dir` except `keep` (built names) and their compressed copies."""
+    keep = set(keep) | {MANIFEST_NAME}
+    keep |= {name + suffix for name in keep for _, suffix in ENCODINGS}
+    removed = []
+    for name in os.listdir(build_dir):
+        # .tmp- files may be another process's write in progress
+        if name in keep or name.startswith(".tmp-"):
+            continue
+        try:
+            os.unlink(os.path.join(build_dir, name))
+        except OSError:
+            continue
+        removed.append(name)
+    return removed
+
+
+def _write_atomic(path, data):
+    """Writes via a temporary file, so concurrently starting workers never see half a file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class Asset:
+    """One built asset: its fingerprint, content type and bytes per Content-Encoding."""
+    __slots__ = ("name", "built_name", "etag", "variants")
+
+    def __init__(self, name, built_name, etag, variants):
+        self.name = name
+        self.built_name = built_name
+        self.etag = etag
+        self.variants = variants
+
+    def negotiate(self, accepts):
+        """Returns (encoding or None, body) for a client; `accepts(encoding)` says if it takes one."""
+        for encoding, _ in ENCODINGS:
+            body = self.variants.get(encoding)
+            if body is not None and accepts(encoding):
+                return encoding, body
+        return None, self.variants[None]
+
+
+def build(static_dir=STATIC_DIR, write=True):
+    """Fingerprints and precompresses the files in `static_dir`; returns {built_name: Asset}.
+
+    Files already on disk are reused, and files of older builds are
+    deleted. With `write` False, or when the build directory can't be
+    written, assets are only kept in memory.
+    """
+    build_dir = os.path.join(static_dir, BUILD_DIR_NAME)
+    if write:
+        try:
+            os.makedirs(build_dir, exist_ok=True)
+        except OSError as e:
+            print(f"Can't write built assets: {str(e)}. Serving them from memory.")
+            write = False
+    assets = {}
+    manifest = {}
+    for name in sorted(os.listdir(static_dir)):
+        path = os.path.join(static_dir, name)
+        if not os.path.isfile(path) or name.startswith("."):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = fingerprint(data)
+        built_name = fingerprinted_name(name, digest)
+        variants = {None: data}
+        if name.endswith(COMPRESSIBLE):
+            for encoding, suffix in ENCODINGS:
+                built_path = os.path.join(build_dir, built_name + suffix)
+                if os.path.exists(built_path):
+                    with open(built_path, "rb") as f:
+                        body = f.read()
+                else:
+                    body = compress(data, encoding)
+                    if body is None or len(body) >= len(data):
+                        continue
+                    if write:
+                        _write_atomic(built_path, body)
+                variants[encoding] = body
+        if write and not os.path.exists(os.path.join(build_dir, built_name)):
+            _write_atomic(os.path.join(build_dir, built_name), data)
+        assets[built_name] = Asset(name, built_name, digest, variants)
+        manifest[name] = built_name
+    if write:
+        _write_atomic(os.path.join(build_dir, MANIFEST_NAME),
+                      json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+        prune(build_dir, assets)
+    return assets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed static assets.")
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    args = parser.parse_args()
+    for asset in build(args.static_dir).values():
+        sizes = ", ".join(f"{encoding or 'identity'} {len(body)} B" for encoding, body in asset.variants.items())
+        print(f"{asset.name} -> {BUILD_DIR_NAME}/{asset.built_name} ({sizes})")
+    if brotli is None:
+        print("brotli is not installed; only gzip copies were built.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Micro-benchmark: compiled keyword matcher vs. the old if/elif substring chain.
+
+Run with: python -m benchmarks.bench_categorizer
+"""
+import argparse
+import random
+import string
+import timeit
+
+from categorizer import KEYWORD_TABLE, KeywordMatcher, get_default_category
+
+SAMPLES = [
+    "Dinner at an Italian restaurant",
+    "Uber ride to airport",
+    "Rent payment for June",
+    "Monthly Netflix subscription",
+    "Electricity bill for March",
+    "Amazon order - headphones",
+    "Doctor visit copay",
+    "Textbook for university course",
+    "Hotel booking in Lisbon",
+    "Transfer to savings account",
+]
+
+
+def legacy_default_category(description):
+    """The original substring chain from main.py, kept here for comparison."""
+    desc = description.lower()
+    if "restaurant" in desc or "food" in desc or "dinner" in desc or "lunch" in desc or "breakfast" in desc or "coffee" in desc:
+        return "food"
+    elif "uber" in desc or "taxi" in desc or "bus" in desc or "train" in desc or "gas" in desc or "car" in desc:
+        return "transportation"
+    elif "rent" in desc or "mortgage" in desc or "home" in desc:
+        return "housing"
+    elif "electricity" in desc or "water" in desc or "bill" in desc or "internet" in desc or "phone" in desc:
+        return "utilities"
+    elif "movie" in desc or "netflix" in desc or "spotify" in desc or "concert" in desc or "game" in desc:
+        return "entertainment"
+    elif "amazon" in desc or "mall" in desc or "store" in desc or "buy" in desc or "purchase" in desc:
+        return "shopping"
+    elif "doctor" in desc or "medicine" in desc or "hospital" in desc or "health" in desc:
+        return "health"
+    elif "course" in desc or "book" in desc or "tuition" in desc or "class" in desc or "school" in desc:
+        return "education"
+    elif "hotel" in desc or "flight" in desc or "vacation" in desc or "trip" in desc or "travel" in desc:
+        return "travel"
+    else:
+        return "other"
+
+
+def inflated_table(factor, seed=0):
+    """Returns KEYWORD_TABLE padded with random keywords, `factor` times its size."""
+    rng = random.Random(seed)
+    table = {}
+    for category, keywords in KEYWORD_TABLE.items():
+        strong = list(keywords["strong"])
+        for _ in range(len(strong) * (factor - 1)):
+            strong.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))))
+        table[category] = {"strong": strong, "weak": list(keywords.get("weak", []))}
+    return table
+
+
+def per_call_us(func, number):
+    total = timeit.timeit(lambda: [func(s) for s in SAMPLES], number=number)
+    return total / (number * len(SAMPLES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=5000, help="iterations over the sample set")
+    args = parser.parse_args()
+
+    print(f"{'engine':<28}{'keywords':>10}{'us/call':>10}")
+    legacy_keywords = 44
+    print(f"{'legacy if/elif chain':<28}{legacy_keywords:>10}{per_call_us(legacy_default_category, args.number):>10.2f}")
+    print(f"{'compiled matcher':<28}{len(KeywordMatcher(KEYWORD_TABLE).index):>10}"
+          f"{per_call_us(get_default_category, args.number):>10.2f}")
+    for factor in (10, 100, 1000):
+        matcher = KeywordMatcher(inflated_table(factor))
+        label = f"compiled matcher x{factor}"
+        print(f"{label:<28}{len(matcher.index):>10}{per_call_us(matcher.match, args.number):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
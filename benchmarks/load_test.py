@@ -0,0 +1,222 @@
+"""Load-test and benchmark suite for the API, run fully offline.
+
+Starts the mock Mistral server (with configurable latency, jitter, error and
+429 rates), launches each server mode in a subprocess pointed at it, and
+drives a weighted mix of requests at each concurrency level. Prints one JSON
+object per (mode, concurrency) run with overall and per-endpoint throughput
+and p50/p95/p99 latency, plus what the mock upstream saw.
+
+Run with: python -m benchmarks.load_test --latency 0.5 --jitter 0.2 --concurrency 10,100,400 \
+              --mix categorize=70,batch=5,query=15,query_stream=10 --rate-limit-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import aiohttp
+
+from benchmarks.mock_mistral import MockMistral
+
+SERVER_COMMANDS = {
+    "flask": [sys.executable, "-c",
+              "import sys, main; main.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)", "{port}"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi_app:app", "--host", "127.0.0.1",
+             "--log-level", "warning", "--port", "{port}"],
+    # Pre-forked production mode; run once per --workers count
+    "gunicorn": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", "127.0.0.1:{port}",
+                 "--log-level", "warning", "main:app"],
+}
+
+QUESTIONS = ("How do I budget for {}?", "Is the 50/30/20 rule right for {}?",
+             "How much should I save for {} each month?", "Tips to spend less on {}?")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def random_word(k=16):
+    return "".join(random.choices(string.ascii_lowercase, k=k))
+
+
+def random_description():
+    # Letters only, so the category cache can't collapse requests together
+    return "load test " + random_word()
+
+
+# name -> (modes that serve it, method, path, payload factory)
+ENDPOINTS = {
+    "categorize": (("flask", "asgi", "gunicorn"), "POST", "/api/categorize",
+                   lambda: {"description": random_description()}),
+    "batch": (("flask", "gunicorn"), "POST", "/api/categorize/batch",
+              lambda: {"descriptions": [random_description() for _ in range(20)]}),
+    "query": (("flask", "asgi", "gunicorn"), "POST", "/api/query",
+              lambda: {"query": random.choice(QUESTIONS).format(random_word(8))}),
+    "query_stream": (("flask", "asgi", "gunicorn"), "POST", "/api/query/stream",
+                     lambda: {"query": random.choice(QUESTIONS).format(random_word(8))}),
+    "expenses": (("flask", "gunicorn"), "GET", "/api/expenses?limit=50", lambda: None),
+    "summary": (("flask", "gunicorn"), "GET", "/api/summary", lambda: None),
+    "status": (("flask", "asgi", "gunicorn"), "GET", "/api/status", lambda: None),
+}
+
+
+def parse_mix(text):
+    """Parses "categorize=70,query=30" into {"categorize": 70.0, "query": 30.0}."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint in mix: {name} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+
+    def ms(pct):
+        value = percentile(latencies, pct)
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(50),
+        "p95_ms": ms(95),
+        "p99_ms": ms(99),
+    }
+
+
+def start_server(mode, upstream_url, data_dir, workers=None):
+    port = free_port()
+    env = dict(os.environ, SMARTSPEND_WORKERS=str(workers or 1), MISTRAL_API_KEY="load-test", MISTRAL_API_URL=upstream_url,
+               SMARTSPEND_CACHE_DB="", SMARTSPEND_LEDGER_DB=os.path.join(data_dir, f"{mode}-ledger.db"),
+               SMARTSPEND_LABEL_LOG=os.path.join(data_dir, f"{mode}-labels.jsonl"),
+               SMARTSPEND_MODEL_PATH=os.path.join(data_dir, "no-model.npz"))
+    proc = subprocess.Popen([part.format(port=port) for part in SERVER_COMMANDS[mode]], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/api/status", timeout=1):
+                return proc, base_url
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+async def drive(base_url, mix, concurrency, total, timeout):
+    """Sends `total` requests drawn from `mix` with at most `concurrency` in flight."""
+    names = list(mix)
+    plan = random.choices(names, weights=[mix[n] for n in names], k=total)
+    queue = asyncio.Queue()
+    for name in plan:
+        queue.put_nowait(name)
+    latencies = {name: [] for name in names}
+    errors = dict.fromkeys(names, 0)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(base_url, connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as client:
+        async def worker():
+            while not queue.empty():
+                name = queue.get_nowait()
+                _, method, path, payload = ENDPOINTS[name]
+                start = time.perf_counter()
+                try:
+                    async with client.request(method, path, json=payload()) as response:
+                        response.raise_for_status()
+                        # Read the whole body, so streams are timed to their last token
+                        await response.read()
+                    latencies[name].append(time.perf_counter() - start)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors[name] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    result = summarize([v for values in latencies.values() for v in values], sum(errors.values()), elapsed)
+    result["elapsed_s"] = round(elapsed, 3)
+    result["endpoints"] = {name: summarize(latencies[name], errors[name], elapsed) for name in names}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default="flask,asgi", help=f"server modes ({', '.join(SERVER_COMMANDS)})")
+    parser.add_argument("--workers", default="1", help="worker process counts for the gunicorn mode, e.g. 1,2,4")
+    parser.add_argument("--concurrency", default="10,50,100,200,400")
+    parser.add_argument("--requests-per-worker", type=int, default=4)
+    parser.add_argument("--mix", default="categorize=1",
+                        help=f"weighted endpoints, e.g. categorize=70,query=30 ({', '.join(ENDPOINTS)})")
+    parser.add_argument("--latency", type=float, default=0.5, help="mock upstream latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random upstream delay, up to (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream calls failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of upstream calls getting 429")
+    parser.add_argument("--timeout", type=float, default=30.0, help="client timeout (s)")
+    parser.add_argument("--seed", type=int, help="seed for request mix and upstream failures")
+    parser.add_argument("--output", help="also write all results to this file as a JSON array")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    mix = parse_mix(args.mix)
+    mock = MockMistral(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       rate_limit_rate=args.rate_limit_rate, seed=args.seed).start_in_thread()
+    upstream = {"latency_s": args.latency, "jitter_s": args.jitter,
+                "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate}
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="smartspend-bench-") as data_dir:
+        runs = [(mode, int(workers) if mode == "gunicorn" else 1)
+                for mode in args.modes.split(",")
+                for workers in (args.workers.split(",") if mode == "gunicorn" else [1])]
+        for mode, workers in runs:
+            mode_mix = {name: weight for name, weight in mix.items() if mode in ENDPOINTS[name][0]}
+            if not mode_mix:
+                continue
+            proc, base_url = start_server(mode, mock.url, data_dir, workers)
+            try:
+                for concurrency in (int(c) for c in args.concurrency.split(",")):
+                    total = concurrency * args.requests_per_worker
+                    before = dict(mock.responses)
+                    result = asyncio.run(drive(base_url, mode_mix, concurrency, total, args.timeout))
+                    seen = {str(status): count - before.get(status, 0)
+                            for status, count in mock.responses.items()}
+                    result = {"mode": mode, "workers": workers, "concurrency": concurrency, "mix": mode_mix,
+                              "upstream": dict(upstream, responses=seen), **result}
+                    results.append(result)
+                    print(json.dumps(result), flush=True)
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
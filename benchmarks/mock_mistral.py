@@ -0,0 +1,167 @@
+"""Offline stand-in for the Mistral chat-completions endpoint.
+
+Answers categorization prompts with a fixed category (a JSON object of them
+for batched prompts) and anything else with a short sentence, after `latency` plus up to `jitter` seconds, both as plain
+JSON and as an SSE stream when the request asks for "stream": true. A share
+of requests can fail with 500 (`error_rate`) or be rate limited with 429 and
+a Retry-After header (`rate_limit_rate`). It runs on asyncio so it can hold
+thousands of slow requests at once.
+
+Run with: python -m benchmarks.mock_mistral --port 8089 --latency 0.5 --jitter 0.2 --rate-limit-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+from collections import Counter
+
+QUERY_ANSWER = ("Try the 50/30/20 rule: half of your income for needs, 30% for wants "
+                "and 20% for savings or paying down debt.")
+
+
+class MockMistral:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.5, answer="shopping", jitter=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1, query_answer=QUERY_ANSWER, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.answer = answer
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.query_answer = query_answer
+        self.requests = 0
+        self.responses = Counter()
+        self._random = random.Random(seed)
+        self._server = None
+        self._loop = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                payload = json.loads(body or b"{}")
+                status = self._pick_status()
+                self.responses[status] += 1
+                if status == 429:
+                    # Rate limits are refused straight away, like the real API
+                    self._write_json(writer, 429, {"message": "Requests rate limit exceeded"},
+                                     [f"Retry-After: {self.retry_after}"])
+                    await writer.drain()
+                    continue
+                await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+                if status == 500:
+                    self._write_json(writer, 500, {"message": "Internal server error"})
+                elif payload.get("stream"):
+                    await self._write_stream(writer, self._reply_for(payload))
+                else:
+                    self._write_json(writer, 200, {
+                        "choices": [{"message": {"role": "assistant", "content": self._reply_for(payload)}}]
+                    })
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _pick_status(self):
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return 200
+
+    def _reply_for(self, payload):
+        messages = payload.get("messages") or [{}]
+        content = messages[-1].get("content", "")
+        if content.startswith("Categorize these expenses"):
+            # Batched prompt: one numbered line per expense, answered as JSON
+            count = sum(1 for line in content.splitlines()[1:] if line.split(".", 1)[0].isdigit())
+            return json.dumps({str(i): self.answer for i in range(1, count + 1)})
+        if content.startswith("Categorize"):
+            return self.answer
+        return self.query_answer
+
+    def _write_json(self, writer, status, data, extra_headers=()):
+        body = json.dumps(data).encode()
+        head = [f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(body)}"]
+        head.extend(extra_headers)
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+
+    async def _write_stream(self, writer, answer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        events = [f"data: {json.dumps({'choices': [{'delta': {'content': word + ' '}}]})}\n\n"
+                  for word in answer.split()]
+        events.append("data: [DONE]\n\n")
+        for event in events:
+            chunk = event.encode()
+            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    def start_in_thread(self):
+        """Runs the server on a background event loop and returns once it is listening."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.serve())
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, daemon=True, name="mock-mistral").start()
+        ready.wait()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before each reply")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    args = parser.parse_args()
+
+    mock = MockMistral(args.host, args.port, args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after)
+
+    async def run():
+        server = await mock.serve()
+        print(f"Mock Mistral listening on {mock.url}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Tiered categorization engine shared by every entry point.
+
+A description goes through a chain of tiers, cheapest first: the
+exact-match cache, the merchant dictionary, the keyword rules, the local
+model and finally the LLM. The dictionary only answers descriptions that
+name a merchant and nothing else, so free text still reaches the rules.
+The first tier that answers wins. A tier that can't be used right now (no
+API key, circuit open, deadline passed) raises TierUnavailable with the
+reason, and the chain moves on. When nothing answers the result is "other".
+
+Every tier call is timed. stats() reports per-tier calls, answer rate and
+latency percentiles, and the same timings go to /api/metrics, so the chain
+can be tuned against real numbers.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from categorizer import match_categories, match_category
+from metrics import Histogram
+
+DEFAULT_CATEGORY = "other"
+
+TIER_LATENCY = Histogram("smartspend_categorize_tier_duration_seconds",
+                         "Time spent in each categorization tier, by outcome (hit, miss, unavailable)",
+                         ("tier", "outcome"))
+
+
+class TierUnavailable(Exception):
+    """Raised by a tier that can't answer right now; the message is the reason."""
+
+    @property
+    def reason(self):
+        return str(self)
+
+
+class Tier:
+    """One step of the chain. Subclasses implement lookup(); lookup_many() loops by default."""
+    name = "tier"
+
+    def lookup(self, description, budget=None):
+        """Returns a category, or None to pass the description on."""
+        raise NotImplementedError
+
+    def lookup_many(self, descriptions):
+        """Returns one category (or None) per description.
+
+        A TierUnavailable in place of a category skips just that description.
+        """
+        return [self.lookup(description) for description in descriptions]
+
+
+class CacheTier(Tier):
+    name = "cache"
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def lookup(self, description, budget=None):
+        return self.cache.get(description)
+
+
+class MerchantTier(Tier):
+    """The compiled merchant dictionary (see merchant_dict.py), if there is one."""
+    name = "merchants"
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+
+    def lookup(self, description, budget=None):
+        if self.dictionary is None:
+            return None
+        return self.dictionary.lookup(description)
+
+
+class RulesTier(Tier):
+    """The compiled keyword rules; batches are matched in a single regex pass."""
+    name = "rules"
+
+    def lookup(self, description, budget=None):
+        return match_category(description)
+
+    def lookup_many(self, descriptions):
+        return match_categories(descriptions)
+
+
+class ModelTier(Tier):
+    """The local classifier, answering only when at least `min_confidence` sure."""
+    name = "model"
+
+    def __init__(self, model, min_confidence=0.9):
+        self.model = model
+        self.min_confidence = min_confidence
+
+    def lookup(self, description, budget=None):
+        if self.model is None:
+            return None
+        category, confidence = self.model.predict(description)
+        return category if confidence >= self.min_confidence else None
+
+
+class LLMTier(Tier):
+    """Asks the LLM through `fetch(description)`, which returns a category or None.
+
+    `available()` may return a reason to skip the call (e.g. "offline"). With
+    a `pool`, single lookups wait at most `budget` seconds; the call keeps
+    running in the pool, so `fetch` can still cache a late answer. With a
+    `cache`, answers are stored there.
+
+    Batches (lookup_many) go through `bulk_fetch` on `bulk_pool` when given,
+    so a large batch can't queue ahead of single lookups.
+    """
+    name = "llm"
+
+    def __init__(self, fetch, available=None, pool=None, budget=None, cache=None, bulk_fetch=None, bulk_pool=None):
+        self.fetch = fetch
+        self.available = available
+        self.pool = pool
+        self.budget = budget
+        self.cache = cache
+        self.bulk_fetch = bulk_fetch or fetch
+        self.bulk_pool = bulk_pool or pool
+
+    def _check_available(self):
+        reason = self.available() if self.available is not None else None
+        if reason:
+            raise TierUnavailable(reason)
+
+    def _fetch(self, description, fetch=None):
+        try:
+            category = (fetch or self.fetch)(description)
+        except Exception as e:
+            print(f"Error with API: {str(e)}. Using local categorization.")
+            return None
+        if category is not None and self.cache is not None:
+            self.cache.set(description, category)
+        return category
+
+    def lookup(self, description, budget=None):
+        self._check_available()
+        budget = self.budget if budget is None else budget
+        if self.pool is None or budget is None:
+            category = self._fetch(description)
+        else:
+            try:
+                category = self.pool.submit(self._fetch, description).result(timeout=budget)
+            except FutureTimeoutError:
+                raise TierUnavailable("deadline") from None
+        if category is None:
+            raise TierUnavailable("upstream_error")
+        return category
+
+    def _bulk_fetch(self, description):
+        category = self._fetch(description, self.bulk_fetch)
+        return TierUnavailable("upstream_error") if category is None else category
+
+    def lookup_many(self, descriptions):
+        self._check_available()
+        if self.bulk_pool is None:
+            return [self._bulk_fetch(description) for description in descriptions]
+        return list(self.bulk_pool.map(self._bulk_fetch, descriptions))
+
+
+class AsyncLLMTier(LLMTier):
+    """LLMTier for asyncio servers: `fetch` is a coroutine function. `pool` is unused."""
+
+    async def _afetch(self, description):
+        try:
+            category = await self.fetch(description)
+        except Exception as e:
+            print(f"Error with API: {str(e)}. Using local categorization.")
+            return None
+        if category is not None and self.cache is not None:
+            self.cache.set(description, category)
+        return category
+
+    async def alookup(self, description, budget=None):
+        self._check_available()
+        budget = self.budget if budget is None else budget
+        task = asyncio.ensure_future(self._afetch(description))
+        try:
+            # Shielded, so a reply that misses the budget is still cached
+            category = await asyncio.wait_for(asyncio.shield(task), budget)
+        except asyncio.TimeoutError:
+            raise TierUnavailable("deadline") from None
+        if category is None:
+            raise TierUnavailable("upstream_error")
+        return category
+
+
+class _TierStats:
+    __slots__ = ("calls", "answered", "unavailable", "seconds", "samples")
+
+    def __init__(self):
+        self.calls = self.answered = self.unavailable = 0
+        self.seconds = 0.0
+        # Recent per-call latencies, for percentiles
+        self.samples = deque(maxlen=1024)
+
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+class CategorizationEngine:
+    """Runs descriptions through `tiers` in order and keeps per-tier timing statistics."""
+
+    def __init__(self, tiers, default=DEFAULT_CATEGORY):
+        self.tiers = [tier for tier in tiers if tier is not None]
+        self.default = default
+        self._lock = threading.Lock()
+        self._stats = {tier.name: _TierStats() for tier in self.tiers}
+        self._defaults = 0
+
+    def _record(self, tier, elapsed, outcome, calls=1, answered=0):
+        TIER_LATENCY.observe(elapsed, tier.name, outcome)
+        with self._lock:
+            stats = self._stats[tier.name]
+            stats.calls += calls
+            stats.answered += answered
+            stats.unavailable += outcome == "unavailable"
+            stats.seconds += elapsed
+            stats.samples.append(elapsed / calls)
+
+    def categorize(self, description, budget=None):
+        """Returns (category, source, reason).
+
+        source is the name of the tier that answered, or "fallback"; reason
+        is why the last unavailable tier was skipped, if one was.
+        """
+        reason = None
+        for tier in self.tiers:
+            start = time.perf_counter()
+            try:
+                category = tier.lookup(description, budget)
+            except TierUnavailable as e:
+                self._record(tier, time.perf_counter() - start, "unavailable")
+                reason = e.reason
+                continue
+            hit = category is not None
+            self._record(tier, time.perf_counter() - start, "hit" if hit else "miss", answered=int(hit))
+            if hit:
+                return category, tier.name, reason
+        with self._lock:
+            self._defaults += 1
+        return self.default, "fallback", reason
+
+    async def acategorize(self, description, budget=None):
+        """categorize() for asyncio servers; tiers with an alookup() coroutine are awaited."""
+        reason = None
+        for tier in self.tiers:
+            start = time.perf_counter()
+            try:
+                if hasattr(tier, "alookup"):
+                    category = await tier.alookup(description, budget)
+                else:
+                    category = tier.lookup(description, budget)
+            except TierUnavailable as e:
+                self._record(tier, time.perf_counter() - start, "unavailable")
+                reason = e.reason
+                continue
+            hit = category is not None
+            self._record(tier, time.perf_counter() - start, "hit" if hit else "miss", answered=int(hit))
+            if hit:
+                return category, tier.name, reason
+        with self._lock:
+            self._defaults += 1
+        return self.default, "fallback", reason
+
+    def categorize_many(self, descriptions):
+        """Categorizes distinct descriptions tier by tier; returns {description: (category, source, reason)}.
+
+        Each tier sees only what earlier tiers left unanswered, in one batch.
+        reason is as in categorize(), per description.
+        """
+        results = {}
+        reasons = {}
+        remaining = list(descriptions)
+        for tier in self.tiers:
+            if not remaining:
+                break
+            start = time.perf_counter()
+            try:
+                categories = tier.lookup_many(remaining)
+            except TierUnavailable as e:
+                self._record(tier, time.perf_counter() - start, "unavailable", calls=len(remaining))
+                reasons.update(dict.fromkeys(remaining, e.reason))
+                continue
+            unanswered = []
+            for description, category in zip(remaining, categories):
+                if isinstance(category, TierUnavailable):
+                    reasons[description] = category.reason
+                    unanswered.append(description)
+                elif category is None:
+                    unanswered.append(description)
+                else:
+                    results[description] = (category, tier.name, reasons.get(description))
+            answered = len(remaining) - len(unanswered)
+            self._record(tier, time.perf_counter() - start, "hit" if answered else "miss",
+                         calls=len(remaining), answered=answered)
+            remaining = unanswered
+        for description in remaining:
+            results[description] = (self.default, "fallback", reasons.get(description))
+        with self._lock:
+            self._defaults += len(remaining)
+        return results
+
+    def stats(self):
+        """Per-tier calls, answers and latency (ms), in chain order."""
+        with self._lock:
+            snapshot = [(tier.name, self._stats[tier.name]) for tier in self.tiers]
+            tiers = []
+            for name, stats in snapshot:
+                samples = sorted(stats.samples)
+                tiers.append({
+                    "tier": name,
+                    "calls": stats.calls,
+                    "answered": stats.answered,
+                    "unavailable": stats.unavailable,
+                    "answer_ratio": round(stats.answered / stats.calls, 4) if stats.calls else 0.0,
+                    "mean_ms": round(stats.seconds / stats.calls * 1000, 3) if stats.calls else None,
+                    "p50_ms": round(_percentile(samples, 50) * 1000, 3) if samples else None,
+                    "p95_ms": round(_percentile(samples, 95) * 1000, 3) if samples else None,
+                })
+            return {"tiers": tiers, "fallback": self._defaults}
+
+
+def default_engine(fetch=None, cache=None, model=None, min_confidence=0.9, merchants=None):
+    """The standard chain for entry points without their own upstream plumbing.
+
+    `fetch(description)` asks the LLM; without it the LLM tier reports "offline".
+    """
+    return CategorizationEngine([
+        CacheTier(cache) if cache is not None else None,
+        MerchantTier(merchants),
+        RulesTier(),
+        ModelTier(model, min_confidence),
+        LLMTier(fetch, available=(lambda: None if fetch else "offline"), cache=cache),
+    ])
@@ -0,0 +1,174 @@
+import bisect
+import hashlib
+import json
+import re
+
+# Categories the app knows about, in tie-break order
+CATEGORIES = ("food", "transportation", "housing", "utilities", "entertainment",
+              "shopping", "health", "education", "travel", "other")
+
+# Keyword rules for local categorization. "strong" keywords identify a
+# category on their own; "weak" keywords only decide when nothing stronger
+# matched (e.g. "Netflix subscription" is entertainment, not utilities).
+# Multi-word phrases outrank single words, so "gas bill" beats "gas".
+# Remaining ties go to the category listed first.
+KEYWORD_TABLE = {
+    "food": {
+        "strong": ["restaurant", "cafe", "coffee", "dinner", "lunch", "breakfast", "brunch",
+                   "meal", "pizza", "burger", "food", "grocery", "groceries", "supermarket",
+                   "takeout", "bakery"],
+        "weak": ["snack", "drinks"],
+    },
+    "transportation": {
+        "strong": ["uber", "lyft", "taxi", "cab", "car", "gas", "fuel", "petrol", "bus",
+                   "train", "subway", "metro", "transportation", "toll", "parking"],
+        "weak": ["ride", "transit"],
+    },
+    "housing": {
+        "strong": ["rent", "mortgage", "apartment", "house", "housing", "property",
+                   "real estate", "condo", "furniture"],
+        "weak": ["home", "maintenance", "repair"],
+    },
+    "utilities": {
+        "strong": ["electricity", "electric bill", "water", "water bill", "gas bill",
+                   "internet", "wifi", "phone", "phone bill", "utility", "utilities", "cable"],
+        "weak": ["bill", "subscription"],
+    },
+    "entertainment": {
+        "strong": ["movie", "cinema", "theater", "concert", "netflix", "spotify", "music",
+                   "game", "entertainment", "streaming"],
+        "weak": ["show", "party", "event"],
+    },
+    "shopping": {
+        "strong": ["amazon", "clothing", "clothes", "shirt", "pants", "shoe", "online shopping",
+                   "mall", "retail", "shopping"],
+        "weak": ["store", "buy", "purchase"],
+    },
+    "health": {
+        "strong": ["doctor", "medical", "medicine", "healthcare", "pharmacy", "prescription",
+                   "hospital", "dental", "dentist", "gym", "fitness", "health"],
+        "weak": ["clinic"],
+    },
+    "education": {
+        "strong": ["tuition", "school", "college", "university", "course", "book",
+                   "education", "tutorial", "learning", "training"],
+        "weak": ["class"],
+    },
+    "travel": {
+        "strong": ["hotel", "airbnb", "flight", "airline", "vacation", "travel", "booking",
+                   "resort", "tourism"],
+        "weak": ["trip"],
+    },
+}
+
+STRONG, WEAK = 2, 1
+
+
+def _trie_pattern(words):
+    """Builds a regex alternation that shares common prefixes between words."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        ends_here = "" in node
+        branches = [(r"\s+" if ch == " " else re.escape(ch)) + build(child)
+                    for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not ends_here:
+            return branches[0]
+        pattern = "(?:" + "|".join(branches) + ")"
+        return pattern + "?" if ends_here else pattern
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Classifies text in one regex pass over a keyword table."""
+
+    def __init__(self, table, categories=CATEGORIES):
+        self.index = {}
+        order = {category: i for i, category in enumerate(categories)}
+        for category, keywords in table.items():
+            for strength, weight in (("strong", STRONG), ("weak", WEAK)):
+                for keyword in keywords.get(strength, ()):
+                    keyword = " ".join(keyword.lower().split())
+                    rank = (weight + (" " in keyword), -order.get(category, len(order)))
+                    if keyword not in self.index or rank > self.index[keyword][1]:
+                        self.index[keyword] = (category, rank)
+        # Whole words only, allowing simple plurals ("bills", "buses")
+        self.pattern = re.compile(r"\b(" + _trie_pattern(self.index) + r")(?:e?s)?\b")
+
+    def match(self, text):
+        """Returns the best matching category, or None when no keyword matches."""
+        best = None
+        for keyword in self.pattern.findall(text.lower()):
+            hit = self.index.get(keyword) or self.index[" ".join(keyword.split())]
+            if best is None or hit[1] > best[1]:
+                best = hit
+        return best[0] if best else None
+
+    def match_many(self, texts):
+        """Classifies a list of texts in a single pass over their concatenation."""
+        texts = [text.lower().replace("\x00", " ") for text in texts]
+        starts, offset = [], 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        best = [None] * len(texts)
+        # NUL is neither a word nor a whitespace character, so matches can't span items
+        for m in self.pattern.finditer("\x00".join(texts)):
+            i = bisect.bisect_right(starts, m.start()) - 1
+            keyword = m.group(1)
+            hit = self.index.get(keyword) or self.index[" ".join(keyword.split())]
+            if best[i] is None or hit[1] > best[i][1]:
+                best[i] = hit
+        return [hit[0] if hit else None for hit in best]
+
+
+    def export(self):
+        """The compiled matcher as plain data, so other runtimes can evaluate it.
+
+        `pattern` is the keyword regex (valid in JavaScript too) and
+        `keywords` maps each keyword to [category index, strength], where
+        strength is 2 for a strong keyword, 1 for a weak one, plus 1 for a
+        phrase. `version` changes whenever any of it does.
+        """
+        categories = list(CATEGORIES)
+        rules = {
+            "categories": categories,
+            "pattern": self.pattern.pattern,
+            "keywords": {keyword: [categories.index(category), rank[0]]
+                         for keyword, (category, rank) in sorted(self.index.items())},
+            "strong": STRONG,
+        }
+        canonical = json.dumps(rules, sort_keys=True, separators=(",", ":"))
+        rules["version"] = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:12]
+        return rules
+
+
+_MATCHER = KeywordMatcher(KEYWORD_TABLE)
+
+
+def match_category(description):
+    """Returns the keyword-rule category for a description, or None if no rule applies."""
+    return _MATCHER.match(description)
+
+
+def match_categories(descriptions):
+    """Batch version of match_category; returns one category or None per description."""
+    return _MATCHER.match_many(descriptions)
+
+
+def export_rules():
+    """The keyword rules in the compact, versioned form served at /api/rules."""
+    return _MATCHER.export()
+
+
+def get_default_category(description):
+    """Local fallback categorization when API is unavailable."""
+    return match_category(description) or "other"
@@ -0,0 +1,118 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_wal import ThreadConnections
+
+SCHEMA = ("CREATE TABLE IF NOT EXISTS category_cache ("
+          "key TEXT PRIMARY KEY, category TEXT NOT NULL, expires_at REAL NOT NULL)",)
+
+# Amounts, dates and reference numbers ("$12.50", "1,200", "06/14", "#1234")
+_AMOUNT_RE = re.compile(r"(?:[$€£₹#]\s*)?\d[\d,.:/-]*")
+
+
+def normalize_description(description):
+    """Cache key for a description: case-folded, digits and amounts stripped, whitespace collapsed."""
+    return " ".join(_AMOUNT_RE.sub(" ", description.casefold()).split())
+
+
+class CategoryCache:
+    """LRU cache of categorization results with a TTL.
+
+    The in-memory tier holds up to `max_entries` keys. If `db_path` is given,
+    results are also written to a SQLite file that survives restarts and is
+    shared by every worker process pointing at it.
+    """
+
+    def __init__(self, max_entries=10000, ttl=86400, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._connections = ThreadConnections(db_path, SCHEMA, timeout=5) if db_path else None
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "db_hits": 0}
+        if db_path:
+            self._db().execute("DELETE FROM category_cache WHERE expires_at < ?", (time.time(),))
+
+    def _db(self):
+        return self._connections.get()
+
+    def _remember(self, key, category, expires_at):
+        """Stores a key in the memory tier; caller must hold the lock."""
+        self._entries[key] = (category, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get(self, description):
+        """Returns the cached category for a description, or None."""
+        key = normalize_description(description)
+        if not key:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[0]
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        if self.db_path:
+            try:
+                row = self._db().execute(
+                    "SELECT category, expires_at FROM category_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)).fetchone()
+            except sqlite3.Error as e:
+                print(f"Category cache read failed: {str(e)}")
+                row = None
+            if row:
+                with self._lock:
+                    self._remember(key, row[0], row[1])
+                    self._stats["hits"] += 1
+                    self._stats["db_hits"] += 1
+                return row[0]
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, description, category):
+        """Caches a category under the normalized description."""
+        key = normalize_description(description)
+        if not key:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, category, expires_at)
+        if self.db_path:
+            try:
+                self._db().execute("INSERT OR REPLACE INTO category_cache VALUES (?, ?, ?)",
+                                   (key, category, expires_at))
+            except sqlite3.Error as e:
+                print(f"Category cache write failed: {str(e)}")
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and the current memory-tier size."""
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), max_entries=self.max_entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["persistent"] = bool(self.db_path)
+        return stats
+
+
+def cache_from_env():
+    """Builds the categorization cache from SMARTSPEND_CACHE_SIZE, _TTL and _DB."""
+    return CategoryCache(
+        max_entries=int(os.environ.get("SMARTSPEND_CACHE_SIZE", "10000")),
+        ttl=int(os.environ.get("SMARTSPEND_CACHE_TTL", str(7 * 24 * 3600))),
+        db_path=os.environ.get("SMARTSPEND_CACHE_DB")
+    )
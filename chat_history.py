@@ -0,0 +1,122 @@
+"""Bounded chat history for the Streamlit app.
+
+HistoryRing keeps a session's most recent entries in memory and drops the
+oldest past its capacity. HistoryStore keeps each user's history in SQLite
+so it survives restarts and follows the user across sessions, trimmed to
+the newest `max_entries` per user. Both hand out history one page at a
+time (newest first), so rendering costs the page size, not the history
+length.
+
+An entry is a dict: id, question, answer, type ("categorization" or
+"query") and created_at.
+
+A stored history is found by an unguessable token (see access_tokens.py),
+not by a name a visitor could type; the store only sees a hash of it.
+"""
+import itertools
+import os
+import time
+from collections import deque
+
+from sqlite_wal import ThreadConnections
+
+DEFAULT_HISTORY_DB = os.path.join("data", "history.db")
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS chat_history ("
+    "id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, question TEXT NOT NULL, "
+    "answer TEXT NOT NULL, type TEXT NOT NULL, created_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS chat_history_user ON chat_history (user_id, id)",
+)
+
+
+def make_entry(entry_id, question, answer, kind, created_at=None):
+    return {"id": entry_id, "question": question, "answer": answer, "type": kind,
+            "created_at": created_at if created_at is not None else time.time()}
+
+
+class HistoryRing:
+    """The newest `capacity` entries of one session, in memory."""
+
+    def __init__(self, capacity=200):
+        self._entries = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+
+    def append(self, question, answer, kind):
+        entry = make_entry(next(self._ids), question, answer, kind)
+        self._entries.append(entry)
+        return entry
+
+    def page(self, number, size):
+        """Returns (entries, has_more) for page `number` (0 = newest)."""
+        start = number * size
+        entries = list(itertools.islice(reversed(self._entries), start, start + size))
+        return entries, start + size < len(self._entries)
+
+    def count(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class HistoryStore:
+    """Per-user chat history in a SQLite database file (WAL mode)."""
+
+    def __init__(self, db_path=None, max_entries=1000):
+        self.db_path = db_path or os.environ.get("SMARTSPEND_HISTORY_DB", DEFAULT_HISTORY_DB)
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._connections = ThreadConnections(self.db_path, SCHEMA)
+        self._db()
+
+    def _db(self):
+        return self._connections.get()
+
+    def append(self, user_id, question, answer, kind):
+        entry = make_entry(None, question, answer, kind)
+        with self._connections.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO chat_history (user_id, question, answer, type, created_at) VALUES (?, ?, ?, ?, ?)",
+                (user_id, question, answer, kind, entry["created_at"]))
+            entry["id"] = cursor.lastrowid
+            # Everything older than the newest max_entries goes
+            conn.execute("DELETE FROM chat_history WHERE user_id = ? AND id <= ("
+                         "SELECT id FROM chat_history WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                         (user_id, user_id, self.max_entries))
+        return entry
+
+    def page(self, user_id, number, size):
+        """Returns (entries, has_more) for page `number` (0 = newest) of a user's history."""
+        rows = self._db().execute(
+            "SELECT id, question, answer, type, created_at FROM chat_history WHERE user_id = ? "
+            "ORDER BY id DESC LIMIT ? OFFSET ?", (user_id, size + 1, number * size)).fetchall()
+        return [make_entry(*row) for row in rows[:size]], len(rows) > size
+
+    def count(self, user_id):
+        return self._db().execute("SELECT COUNT(*) FROM chat_history WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def clear(self, user_id):
+        self._db().execute("DELETE FROM chat_history WHERE user_id = ?", (user_id,))
+
+    def for_user(self, user_id):
+        """A view with HistoryRing's methods, bound to one user."""
+        return UserHistory(self, user_id)
+
+
+class UserHistory:
+    def __init__(self, store, user_id):
+        self.store = store
+        self.user_id = user_id
+
+    def append(self, question, answer, kind):
+        return self.store.append(self.user_id, question, answer, kind)
+
+    def page(self, number, size):
+        return self.store.page(self.user_id, number, size)
+
+    def count(self):
+        return self.store.count(self.user_id)
+
+    def clear(self):
+        self.store.clear(self.user_id)
@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """Stops calling a failing upstream and probes it in the background until it recovers.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    allow() returns False. While open, a daemon thread calls `probe()` every
+    `reset_timeout` seconds; the first successful probe closes the breaker.
+    Without a probe function the breaker lets one trial call through after
+    each `reset_timeout` instead.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, probe=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._prober = None
+        self._stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    @property
+    def state(self):
+        return "open" if self._opened_at is not None else "closed"
+
+    def allow(self):
+        """Returns True if a call to the upstream should be attempted."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self.probe is None and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Let this call through as the trial; restart the clock for everyone else
+                self._opened_at = time.monotonic()
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures < self.failure_threshold or self._opened_at is not None:
+                return
+            self._opened_at = time.monotonic()
+            self._stats["opened"] += 1
+            if self.probe is not None and self._prober is None:
+                self._prober = threading.Thread(target=self._probe_loop, daemon=True,
+                                                name="circuit-breaker-probe")
+                self._prober.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.reset_timeout)
+            with self._lock:
+                if self._opened_at is None:
+                    self._prober = None
+                    return
+                self._stats["probes"] += 1
+            try:
+                healthy = self.probe()
+            except Exception as e:
+                print(f"Upstream probe failed: {str(e)}")
+                healthy = False
+            if healthy:
+                with self._lock:
+                    self._failures = 0
+                    self._opened_at = None
+                    self._prober = None
+                return
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, state=self.state, consecutive_failures=self._failures)
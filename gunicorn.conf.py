@@ -0,0 +1,47 @@
+"""Production serving for main.py: gunicorn -c gunicorn.conf.py main:app
+
+The parent process imports the app once (preload_app), which compiles the
+keyword rules, loads the local model and builds the static assets, then
+forks SMARTSPEND_WORKERS workers that share those pages copy-on-write.
+Each worker opens its own Mistral connections and health prober before it
+takes traffic.
+
+Reloading without dropping requests:
+  kill -HUP <master>   restarts workers from the preloaded code (config changes)
+  kill -USR2 <master>  starts a new master with new code next to the old one;
+                       then kill -QUIT <old master> (its pid is in <pidfile>.oldbin)
+Old workers stop accepting, finish in-flight requests (up to graceful_timeout
+seconds) and exit.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get("SMARTSPEND_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("SMARTSPEND_WORKERS", "0")) or multiprocessing.cpu_count()
+
+# Requests mostly wait on Mistral, so each worker serves many of them on threads
+worker_class = "gthread"
+threads = int(os.environ.get("SMARTSPEND_THREADS", "32"))
+
+preload_app = True
+graceful_timeout = int(os.environ.get("SMARTSPEND_GRACEFUL_TIMEOUT", "30"))
+# Streams can be quiet for a while; keep this above the upstream read timeout
+timeout = int(os.environ.get("SMARTSPEND_WORKER_TIMEOUT", "60"))
+keepalive = 5
+pidfile = os.environ.get("SMARTSPEND_PIDFILE")
+accesslog = os.environ.get("SMARTSPEND_ACCESS_LOG")
+
+
+def when_ready(server):
+    import main
+    main.preload()
+    # Objects created so far are never collected, so collections in the workers
+    # don't write to (and un-share) the pages that hold them
+    gc.freeze()
+    server.log.info("Preloaded app; forking %d workers", server.cfg.workers)
+
+
+def post_fork(server, worker):
+    import main
+    main.warm_up()
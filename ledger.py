@@ -0,0 +1,293 @@
+"""Persistent expense ledger in SQLite (WAL mode).
+
+Every saved expense is one row: description, amount, date, category and
+the source that categorized it, partitioned by user. Listing pages with a
+keyset cursor over (date, id), so page N costs the same as page 1 however
+many rows a user has, and WAL mode lets readers carry on while an import
+is writing.
+
+Per-category totals by month, ISO week and year are kept in a `rollups`
+table. It is updated in the same transaction as every insert, update and
+delete, so a summary reads a few dozen rows instead of scanning history.
+Recompute and check it with: python ledger.py rebuild [--check] [--db PATH]
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+from datetime import date as _date
+
+from sqlite_wal import ThreadConnections
+
+DEFAULT_LEDGER_DB = os.path.join("data", "ledger.db")
+DEFAULT_USER = "default"
+MAX_PAGE_SIZE = 1000
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS expenses ("
+    "id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, description TEXT NOT NULL, amount REAL, "
+    "date TEXT NOT NULL, category TEXT NOT NULL, source TEXT, created_at REAL NOT NULL)",
+    # The rowid (id) is implicitly the last column of every index, so both
+    # of these serve the ORDER BY date DESC, id DESC keyset scan directly
+    "CREATE INDEX IF NOT EXISTS expenses_user_date ON expenses (user_id, date)",
+    "CREATE INDEX IF NOT EXISTS expenses_user_category_date ON expenses (user_id, category, date)",
+    # period is "month", "week" or "year"; bucket is "2024-05", "2024-W19" or "2024"
+    "CREATE TABLE IF NOT EXISTS rollups ("
+    "user_id TEXT NOT NULL, period TEXT NOT NULL, bucket TEXT NOT NULL, category TEXT NOT NULL, "
+    "total REAL NOT NULL, count INTEGER NOT NULL, "
+    "PRIMARY KEY (user_id, period, bucket, category)) WITHOUT ROWID",
+)
+
+UPSERT_ROLLUP = (
+    "INSERT INTO rollups (user_id, period, bucket, category, total, count) VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (user_id, period, bucket, category) DO UPDATE SET "
+    "total = total + excluded.total, count = count + excluded.count"
+)
+
+COLUMNS = ("id", "description", "amount", "date", "category", "source")
+
+
+def iso_date(value):
+    """Returns `value` as a "YYYY-MM-DD" string; raises ValueError unless it is an ISO date."""
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid date: {value!r}")
+    try:
+        return _date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r}") from None
+
+
+def buckets(iso_date):
+    """Rollup buckets for an ISO date: [("month", "2024-05"), ("week", "2024-W19"), ("year", "2024")].
+
+    Rows saved before dates were validated may hold other strings; those
+    aren't rolled up.
+    """
+    try:
+        day = _date.fromisoformat(iso_date)
+    except (TypeError, ValueError):
+        return []
+    iso_year, iso_week, _ = day.isocalendar()
+    # From the parsed date, not the string: fromisoformat also takes "20240514"
+    return [("month", f"{day.year:04d}-{day.month:02d}"), ("week", f"{iso_year}-W{iso_week:02d}"),
+            ("year", f"{day.year:04d}")]
+
+
+def rollup_deltas(user_id, expenses, sign=1, deltas=None):
+    """Adds expense dicts into {(user_id, period, bucket, category): [total, count]}."""
+    deltas = defaultdict(lambda: [0.0, 0]) if deltas is None else deltas
+    for expense in expenses:
+        for period, bucket in buckets(expense["date"]):
+            delta = deltas[(user_id, period, bucket, expense["category"])]
+            delta[0] += sign * (expense.get("amount") or 0.0)
+            delta[1] += sign
+    return deltas
+
+
+class Ledger:
+    """Stores categorized expenses per user in a SQLite database file."""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.environ.get("SMARTSPEND_LEDGER_DB", DEFAULT_LEDGER_DB)
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._connections = ThreadConnections(self.db_path, SCHEMA)
+        self._db()
+
+    def _db(self):
+        return self._connections.get()
+
+    def _write(self, fn, *args):
+        """Runs fn(conn, *args) in a write transaction and returns its result."""
+        with self._connections.transaction() as conn:
+            return fn(conn, *args)
+
+    @staticmethod
+    def _apply_rollups(conn, deltas):
+        conn.executemany(UPSERT_ROLLUP, [key + tuple(value) for key, value in deltas.items()
+                                         if value[0] or value[1]])
+        # Only buckets that lost expenses can have emptied
+        conn.executemany("DELETE FROM rollups WHERE user_id = ? AND period = ? AND bucket = ? "
+                         "AND category = ? AND count = 0", [key for key, value in deltas.items() if value[1] < 0])
+
+    def _insert(self, conn, expenses, user_id):
+        now = time.time()
+        # Stored as YYYY-MM-DD, so ORDER BY date and the range filters compare correctly
+        expenses = [dict(e, date=iso_date(e["date"]) if e.get("date") else _date.today().isoformat())
+                    for e in expenses]
+        conn.executemany(
+            "INSERT INTO expenses (user_id, description, amount, date, category, source, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(user_id, e["description"], e.get("amount"), e["date"], e["category"], e.get("source"), now)
+             for e in expenses])
+        self._apply_rollups(conn, rollup_deltas(user_id, expenses))
+
+    def add(self, expense, user_id=DEFAULT_USER):
+        """Saves one expense dict and returns its id; raises ValueError for a date that isn't ISO."""
+        self._write(self._insert, [expense], user_id)
+        return self._db().execute("SELECT last_insert_rowid()").fetchone()[0]
+
+    def add_many(self, expenses, user_id=DEFAULT_USER):
+        """Saves expense dicts in a single transaction; returns how many were written."""
+        expenses = list(expenses)
+        if expenses:
+            self._write(self._insert, expenses, user_id)
+        return len(expenses)
+
+    def _change(self, conn, expense_id, user_id, changes):
+        old = self.get(expense_id, user_id)
+        if old is None:
+            return None
+        new = None
+        if changes is not None:
+            new = dict(old, **changes)
+            conn.execute("UPDATE expenses SET description = ?, amount = ?, date = ?, category = ?, source = ? "
+                         "WHERE id = ?", (new["description"], new["amount"], new["date"],
+                                          new["category"], new["source"], expense_id))
+        else:
+            conn.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
+        deltas = rollup_deltas(user_id, [old], sign=-1)
+        self._apply_rollups(conn, rollup_deltas(user_id, [new] if new else [], deltas=deltas))
+        return new or old
+
+    def update(self, expense_id, changes, user_id=DEFAULT_USER):
+        """Changes fields of a saved expense (e.g. recategorizes it); returns it, or None if missing.
+
+        A new category marks the expense as categorized by the user. The old
+        values are taken out of the rollups and the new ones added, so moving
+        an amount between categories or months stays consistent.
+        """
+        fields = {k: v for k, v in changes.items() if k in ("description", "amount", "date", "category")}
+        if "category" in fields:
+            fields["source"] = "user"
+        if "date" in fields:
+            fields["date"] = iso_date(fields["date"])
+        return self._write(self._change, expense_id, user_id, fields)
+
+    def delete(self, expense_id, user_id=DEFAULT_USER):
+        """Deletes a saved expense; returns it, or None if missing."""
+        return self._write(self._change, expense_id, user_id, None)
+
+    def get(self, expense_id, user_id=DEFAULT_USER):
+        """Returns one expense as a dict, or None."""
+        row = self._db().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM expenses WHERE id = ? AND user_id = ?",
+            (expense_id, user_id)).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def list(self, user_id=DEFAULT_USER, category=None, start=None, end=None, cursor=None, limit=50):
+        """Returns (expenses, next_cursor), newest first.
+
+        `start`/`end` are inclusive ISO dates. Pass the returned cursor back
+        to get the next page; it is None on the last page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = ["user_id = ?"], [user_id]
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("date <= ?")
+            params.append(end)
+        if cursor:
+            after_date, after_id = decode_cursor(cursor)
+            # The plain "date <= ?" bound lets SQLite seek the index instead of scanning
+            clauses.append("date <= ? AND (date < ? OR id < ?)")
+            params.extend((after_date, after_date, after_id))
+
+        rows = self._db().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM expenses WHERE {' AND '.join(clauses)} "
+            "ORDER BY date DESC, id DESC LIMIT ?", params + [limit + 1]).fetchall()
+        expenses = [dict(zip(COLUMNS, row)) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = expenses[-1]
+            next_cursor = f"{last['date']}|{last['id']}"
+        return expenses, next_cursor
+
+    def summary(self, user_id=DEFAULT_USER, year=None):
+        """Per-category {"total", "count"} by month and ISO week of `year`, plus the year to date.
+
+        Reads only the rollups for one year (at most 12 + 53 + 1 buckets per
+        category), so it costs the same however many expenses are saved.
+        """
+        year = str(year or _date.today().year)
+        rows = self._db().execute(
+            "SELECT period, bucket, category, total, count FROM rollups WHERE user_id = ? AND ("
+            "(period = 'month' AND bucket BETWEEN ? AND ?) OR (period = 'week' AND bucket BETWEEN ? AND ?) "
+            "OR (period = 'year' AND bucket = ?))",
+            (user_id, f"{year}-01", f"{year}-12", f"{year}-W01", f"{year}-W53", year)).fetchall()
+        summary = {"year": int(year), "year_to_date": {}, "months": {}, "weeks": {}}
+        for period, bucket, category, total, count in rows:
+            totals = summary["year_to_date"] if period == "year" else summary[period + "s"].setdefault(bucket, {})
+            totals[category] = {"total": round(total, 2), "count": count}
+        return summary
+
+    def rebuild_rollups(self, check_only=False):
+        """Recomputes every rollup from the expenses table and compares with the stored ones.
+
+        Returns the list of (key, stored, recomputed) mismatches. Unless
+        `check_only`, the stored rollups are then replaced with the recomputed ones.
+        """
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE" if not check_only else "BEGIN")
+        try:
+            fresh = defaultdict(lambda: [0.0, 0])
+            grouped = conn.execute("SELECT user_id, date, category, TOTAL(amount), COUNT(*) FROM expenses "
+                                   "GROUP BY user_id, date, category")
+            for user_id, day, category, total, count in grouped:
+                for period, bucket in buckets(day):
+                    entry = fresh[(user_id, period, bucket, category)]
+                    entry[0] += total
+                    entry[1] += count
+
+            stored = {tuple(row[:4]): list(row[4:]) for row in conn.execute(
+                "SELECT user_id, period, bucket, category, total, count FROM rollups")}
+            mismatches = []
+            for key in sorted(set(fresh) | set(stored)):
+                have, want = stored.get(key, [0.0, 0]), fresh.get(key, [0.0, 0])
+                if have[1] != want[1] or abs(have[0] - want[0]) > 1e-6:
+                    mismatches.append((key, tuple(have), tuple(want)))
+
+            if not check_only:
+                conn.execute("DELETE FROM rollups")
+                conn.executemany("INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?)",
+                                 [key + tuple(value) for key, value in fresh.items()])
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return mismatches
+
+
+def decode_cursor(cursor):
+    """Splits a "date|id" page cursor; raises ValueError if it is malformed."""
+    after_date, _, after_id = cursor.rpartition("|")
+    if not after_date:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return after_date, int(after_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expense ledger maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subcommands.add_parser("rebuild", help="recompute rollups and verify the stored ones")
+    rebuild_parser.add_argument("--db", help="ledger database (default: $SMARTSPEND_LEDGER_DB)")
+    rebuild_parser.add_argument("--check", action="store_true", help="only report mismatches")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    mismatches = Ledger(args.db).rebuild_rollups(check_only=args.check)
+    for key, have, want in mismatches[:50]:
+        print(f"{'/'.join(key)}: stored total={have[0]:.2f} count={have[1]}, "
+              f"recomputed total={want[0]:.2f} count={want[1]}")
+    action = "Checked" if args.check else "Rebuilt"
+    print(f"{action} rollups in {time.perf_counter() - start:.2f}s; {len(mismatches)} mismatched buckets")
+    if args.check and mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
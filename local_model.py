@@ -0,0 +1,198 @@
+"""In-process expense classifier trained on Mistral's own categorizations.
+
+Every category the LLM returns is appended to a JSONL label log. The
+`retrain` command fits a multinomial naive Bayes model over hashed
+character n-grams from that log and saves it as a NumPy archive. The API
+loads it once at startup and only escalates to Mistral when the model's
+confidence is low.
+
+Retrain with: python local_model.py retrain [--labels PATH] [--model PATH]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from categorizer import CATEGORIES
+from category_cache import normalize_description
+
+DEFAULT_LABEL_LOG = os.path.join("data", "llm_labels.jsonl")
+DEFAULT_MODEL_PATH = os.path.join("data", "category_model.npz")
+
+N_FEATURES = 2 ** 17
+NGRAM_SIZES = (3, 4, 5)
+
+
+def features(description, n_features=N_FEATURES):
+    """Hashed character n-gram indices for a description (repeats mean higher counts)."""
+    text = f" {normalize_description(description)} ".encode("utf-8")
+    return np.fromiter(
+        (zlib.crc32(text[i:i + n]) % n_features
+         for n in NGRAM_SIZES for i in range(len(text) - n + 1)),
+        dtype=np.int64
+    )
+
+
+class LocalModel:
+    """Naive Bayes over hashed n-grams with a temperature-calibrated softmax."""
+
+    def __init__(self, log_prior, log_likelihood, temperature=1.0, categories=CATEGORIES):
+        self.log_prior = log_prior
+        self.log_likelihood = log_likelihood
+        self.temperature = temperature
+        self.categories = tuple(categories)
+
+    @classmethod
+    def train(cls, descriptions, labels, alpha=0.1, n_features=N_FEATURES, categories=CATEGORIES):
+        index = {category: i for i, category in enumerate(categories)}
+        counts = np.zeros((len(categories), n_features), dtype=np.float64)
+        class_counts = np.zeros(len(categories), dtype=np.float64)
+        for description, label in zip(descriptions, labels):
+            c = index[label]
+            class_counts[c] += 1
+            np.add.at(counts[c], features(description, n_features), 1)
+
+        smoothed = counts + alpha
+        log_likelihood = np.log(smoothed / smoothed.sum(axis=1, keepdims=True)).astype(np.float32)
+        log_prior = np.log((class_counts + 1) / (class_counts.sum() + len(categories))).astype(np.float32)
+        return cls(log_prior, log_likelihood, 1.0, categories)
+
+    def fit_temperature(self, descriptions, labels):
+        """Picks the softmax temperature that minimizes log loss on held-out data."""
+        index = {category: i for i, category in enumerate(self.categories)}
+        scores = np.stack([self._scores(d) for d in descriptions])
+        target = np.array([index[label] for label in labels])
+        best = (np.inf, 1.0)
+        for temperature in np.geomspace(0.5, 200, 60):
+            logits = scores / temperature
+            logits -= logits.max(axis=1, keepdims=True)
+            log_probs = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+            loss = -log_probs[np.arange(len(target)), target].mean()
+            best = min(best, (loss, float(temperature)))
+        self.temperature = best[1]
+        return best[0]
+
+    def _scores(self, description):
+        return self.log_prior + self.log_likelihood[:, features(description, self.log_likelihood.shape[1])].sum(axis=1)
+
+    def predict(self, description):
+        """Returns (category, confidence) for a description."""
+        logits = self._scores(description) / self.temperature
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        best = int(probs.argmax())
+        return self.categories[best], float(probs[best])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, log_prior=self.log_prior, log_likelihood=self.log_likelihood,
+                 temperature=np.float32(self.temperature), categories=np.array(self.categories))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["log_prior"], data["log_likelihood"], float(data["temperature"]),
+                       [str(c) for c in data["categories"]])
+
+
+def load_model(path=None):
+    """Loads the trained model, or returns None if there isn't one yet."""
+    path = path or os.environ.get("SMARTSPEND_MODEL_PATH", DEFAULT_MODEL_PATH)
+    if not os.path.exists(path):
+        return None
+    try:
+        return LocalModel.load(path)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Could not load local model from {path}: {str(e)}")
+        return None
+
+
+class LabelLog:
+    """Append-only JSONL log of (description, category) pairs produced by the LLM."""
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("SMARTSPEND_LABEL_LOG", DEFAULT_LABEL_LOG)
+        self._lock = threading.Lock()
+
+    def append(self, description, category):
+        line = json.dumps({"description": description, "category": category, "ts": time.time()})
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            print(f"Could not log label: {str(e)}")
+
+    def read(self):
+        """Returns the logged labels, keeping the latest one per normalized description."""
+        latest = {}
+        if not os.path.exists(self.path):
+            return latest
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                key = normalize_description(entry.get("description", ""))
+                if key and entry.get("category") in CATEGORIES:
+                    latest[key] = entry["category"]
+        return latest
+
+
+def retrain(label_path=None, model_path=None, holdout=0.2, seed=0):
+    """Trains a model from the label log, calibrates it on a held-out split and saves it."""
+    labels = LabelLog(label_path).read()
+    if len(labels) < 20:
+        raise SystemExit(f"Need at least 20 distinct labeled descriptions, found {len(labels)}")
+
+    items = list(labels.items())
+    np.random.default_rng(seed).shuffle(items)
+    split = max(1, int(len(items) * holdout))
+    held_out, train_items = items[:split], items[split:]
+
+    model = LocalModel.train([d for d, _ in train_items], [c for _, c in train_items])
+    loss = model.fit_temperature([d for d, _ in held_out], [c for _, c in held_out])
+    accuracy = np.mean([model.predict(d)[0] == c for d, c in held_out])
+
+    # Refit on everything, keeping the calibrated temperature
+    final = LocalModel.train([d for d, _ in items], [c for _, c in items])
+    final.temperature = model.temperature
+    path = model_path or os.environ.get("SMARTSPEND_MODEL_PATH", DEFAULT_MODEL_PATH)
+    final.save(path)
+    print(f"Trained on {len(items)} descriptions; held-out accuracy {accuracy:.3f}, "
+          f"log loss {loss:.3f}, temperature {final.temperature:.2f}. Saved to {path}")
+    return final
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local expense classifier")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    retrain_parser = subcommands.add_parser("retrain", help="train from the LLM label log")
+    retrain_parser.add_argument("--labels", help="label log (default: $SMARTSPEND_LABEL_LOG)")
+    retrain_parser.add_argument("--model", help="output path (default: $SMARTSPEND_MODEL_PATH)")
+    predict_parser = subcommands.add_parser("predict", help="classify descriptions")
+    predict_parser.add_argument("descriptions", nargs="+")
+    predict_parser.add_argument("--model", help="model path (default: $SMARTSPEND_MODEL_PATH)")
+    args = parser.parse_args()
+
+    if args.command == "retrain":
+        retrain(args.labels, args.model)
+    else:
+        model = load_model(args.model)
+        if model is None:
+            raise SystemExit("No trained model found; run the retrain command first")
+        for description in args.descriptions:
+            category, confidence = model.predict(description)
+            print(f"{category:<15}{confidence:6.3f}  {description}")
+
+
+if __name__ == "__main__":
+    main()
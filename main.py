@@ -1,57 +1,317 @@
 import os
-import requests
+import csv
+import functools
 import json
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import mimetypes
+import threading
+import time
+from collections import Counter as Tally
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, abort, g, make_response, render_template, request, jsonify, send_from_directory, stream_with_context
 from dotenv import load_dotenv
+from access_tokens import new_token, token_key
+from categorizer import CATEGORIES, export_rules
+from categorization_engine import CacheTier, CategorizationEngine, LLMTier, MerchantTier, ModelTier, RulesTier
+from mistral_client import get_client
+from category_cache import cache_from_env, normalize_description
+from answer_cache import answer_cache_from_env, normalize_question
+from circuit_breaker import CircuitBreaker
+from local_model import LabelLog, load_model
+from merchant_dict import load_merchant_dict
+from singleflight import SingleFlight
+from statement_import import StatementError, chunked, parse_statement, to_expense
+from ledger import DEFAULT_USER, Ledger, iso_date
+from micro_batcher import RETRY, MicroBatcher
+from upstream_scheduler import BULK, CATEGORIZE, PROBE, QUERY, DeadlineExceeded, UpstreamScheduler, is_throttled
+from upstream_health import prober_from_env
+from assets import BUILD_DIR_NAME, build as build_assets
+import metrics
 
 # Load environment variables from .env file if it exists
 load_dotenv()
 
-# Create Flask application
-app = Flask(__name__, static_folder="static")
+# Create Flask application; /static is served by serve_static below
+app = Flask(__name__, static_folder=None)
+
+# Fingerprinted files are named after their content, so they never need revalidating
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Fingerprinted, gzip/brotli-precompressed copies of static/ (see assets.py). Missing ones
+# are written to static/build/ at import and stale ones removed; requests are served from memory
+static_assets = build_assets()
+built_asset_names = {asset.name: built_name for built_name, asset in static_assets.items()}
 
 # Get API key from environment variable
 MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
 
+# Batch categorization limits
+MAX_BATCH_SIZE = int(os.environ.get("SMARTSPEND_MAX_BATCH_SIZE", "5000"))
+BATCH_CONCURRENCY = int(os.environ.get("SMARTSPEND_BATCH_CONCURRENCY", "8"))
+
+# Statement imports are categorized this many rows at a time
+IMPORT_CHUNK_SIZE = int(os.environ.get("SMARTSPEND_IMPORT_CHUNK_SIZE", "500"))
+
+# Seconds /api/categorize waits for Mistral before answering from the local tiers
+LATENCY_BUDGET = float(os.environ.get("SMARTSPEND_LATENCY_BUDGET", "1.5"))
+
+# Paces Mistral calls to the account's rate limit (SMARTSPEND_UPSTREAM_RATE requests/s,
+# 0 = unlimited), categorizations first, and retries 429/5xx until UPSTREAM_DEADLINE
+upstream_scheduler = UpstreamScheduler(
+    rate=float(os.environ.get("SMARTSPEND_UPSTREAM_RATE", "0")),
+    burst=float(os.environ.get("SMARTSPEND_UPSTREAM_BURST", "0")) or None,
+    max_retries=int(os.environ.get("SMARTSPEND_UPSTREAM_RETRIES", "3"))
+)
+UPSTREAM_DEADLINE = float(os.environ.get("SMARTSPEND_UPSTREAM_DEADLINE", "10"))
+
+# Categorizations waiting up to LLM_BATCH_WINDOW_MS are sent to Mistral together,
+# up to LLM_BATCH_SIZE per prompt and BATCH_CONCURRENCY prompts at a time
+LLM_BATCH_SIZE = int(os.environ.get("SMARTSPEND_LLM_BATCH_SIZE", "16"))
+LLM_BATCH_WINDOW_MS = float(os.environ.get("SMARTSPEND_LLM_BATCH_WINDOW_MS", "5"))
+
+# Connections to Mistral each process opens before taking traffic (see warm_up)
+WARM_CONNECTIONS = int(os.environ.get("SMARTSPEND_WARM_CONNECTIONS", "4"))
+
+# Threads that wait on upstream categorizations; the micro-batchers, not these
+# pools, bound how many requests actually go to Mistral. Batches and imports
+# have their own, so thousands of their items can't queue ahead of a single request.
+upstream_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY * LLM_BATCH_SIZE, thread_name_prefix="mistral")
+bulk_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY * LLM_BATCH_SIZE, thread_name_prefix="mistral-bulk")
+
+# Cache of API categorizations; set SMARTSPEND_CACHE_DB to persist it across restarts and workers
+category_cache = cache_from_env()
+
+# Answers to /api/query questions, reused for close rephrasings (see answer_cache.py)
+answer_cache = answer_cache_from_env()
+
+# Concurrent upstream calls for the same normalized input share one request
+category_flights = SingleFlight()
+query_flights = SingleFlight()
+
+# Local classifier trained from logged Mistral labels (see local_model.py);
+# answers on its own when at least MODEL_CONFIDENCE sure
+label_log = LabelLog()
+local_model = load_model()
+MODEL_CONFIDENCE = float(os.environ.get("SMARTSPEND_MODEL_CONFIDENCE", "0.9"))
+
+# Compiled merchant -> category dictionary (see merchant_dict.py), mapped
+# read-only so forked workers share its pages; None until one is built
+merchant_dict = load_merchant_dict()
+
+# The keyword rules, serialized once; script.js uses them to categorize clear-cut descriptions itself.
+# The merchant dictionary answers before the rules, so while one is loaded the page is told to ask us.
+RULES = export_rules()
+if merchant_dict is not None:
+    RULES['merchants'] = True
+    RULES['version'] += '-merchants'
+RULES_JSON = json.dumps(RULES, separators=(',', ':'))
+
+# Saved expenses (SQLite, WAL mode); location from SMARTSPEND_LEDGER_DB
+ledger = Ledger()
+
+# Prometheus metrics served at /api/metrics (upstream latency is recorded in mistral_client)
+HTTP_REQUESTS = metrics.Counter("smartspend_http_requests_total", "HTTP requests by route, method and status",
+                                ("route", "method", "status"))
+HTTP_LATENCY = metrics.Histogram("smartspend_http_request_duration_seconds",
+                                 "Time to produce a response (first byte for streams) by route",
+                                 ("route", "method"))
+HTTP_IN_FLIGHT = metrics.Gauge("smartspend_http_requests_in_flight", "Requests being handled, by route",
+                               ("route",))
+CATEGORIZATIONS = metrics.Counter("smartspend_categorizations_total",
+                                  "Categorized descriptions by answering source "
+                                  "(cache, rules, merchants, model, llm, fallback)", ("source",))
+FALLBACKS = metrics.Counter("smartspend_categorize_fallbacks_total",
+                            "Categorizations that needed Mistral but couldn't use it, by reason",
+                            ("reason",))
+metrics.CallbackGauge("smartspend_category_cache", "Category cache counters and hit ratio",
+                      lambda: {(k,): v for k, v in category_cache.stats().items() if not isinstance(v, bool)},
+                      ("stat",))
+metrics.CallbackGauge("smartspend_answer_cache", "Answer cache counters and hit ratio",
+                      lambda: {(k,): v for k, v in answer_cache.stats().items()}, ("stat",))
+metrics.CallbackGauge("smartspend_upstream_scheduler", "Upstream calls, retries, 429 pauses and queue length",
+                      lambda: {(k,): v for k, v in upstream_scheduler.stats().items()}, ("stat",))
+metrics.CallbackGauge("smartspend_llm_micro_batches", "Batched categorization prompts sent to Mistral, by lane",
+                      lambda: {(lane, k): v for lane, stats in micro_batch_stats().items() for k, v in stats.items()},
+                      ("lane", "stat"))
+metrics.CallbackGauge("smartspend_upstream_health", "Background probe results: EWMA latency (s), "
+                      "EWMA error rate, 1 if healthy, last success (unix time)",
+                      lambda: upstream_health_samples(), ("stat",))
+metrics.CallbackGauge("smartspend_circuit_breaker_open", "1 while upstream calls are being skipped",
+                      lambda: {(): int(upstream_breaker.state == "open")})
+metrics.CallbackGauge("smartspend_single_flight", "Upstream calls executed, collapsed and in flight",
+                      lambda: {(name, k): v for name, flights in (("categorize", category_flights),
+                                                                  ("query", query_flights))
+                               for k, v in flights.stats().items()}, ("operation", "stat"))
+
+def upstream_health_samples():
+    stats = upstream_health.stats()
+    samples = {('error_rate',): stats['error_rate'], ('healthy',): int(stats['healthy'])}
+    if stats['ewma_latency_ms'] is not None:
+        samples[('ewma_latency_seconds',)] = stats['ewma_latency_ms'] / 1000
+    if stats['last_success'] is not None:
+        samples[('last_success_timestamp',)] = stats['last_success']
+    return samples
+
+def record_categorizations(results):
+    """Counts (category, source, reason) results by source, and by why Mistral wasn't used."""
+    results = list(results)
+    for source, count in Tally(source for _, source, _ in results).items():
+        CATEGORIZATIONS.inc(source, amount=count)
+    for reason, count in Tally(reason for _, _, reason in results if reason).items():
+        FALLBACKS.inc(reason, amount=count)
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.request_start = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(g.metrics_route)
+
+@app.after_request
+def record_request_metrics(response):
+    HTTP_LATENCY.observe(time.perf_counter() - g.request_start, g.metrics_route, request.method)
+    HTTP_REQUESTS.inc(g.metrics_route, request.method, str(response.status_code))
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    # Runs after a streamed response finishes, so in-flight covers the whole stream
+    route = g.pop('metrics_route', None)
+    if route is not None:
+        HTTP_IN_FLIGHT.dec(route)
+
+# Skips Mistral after repeated failures; a trial call after SMARTSPEND_BREAKER_RESET
+# seconds, or the next successful health probe, closes it again
+upstream_breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get("SMARTSPEND_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.environ.get("SMARTSPEND_BREAKER_RESET", "30"))
+)
+
+def ping_upstream():
+    """One probe request; returns (ok, seconds), timing only the request itself."""
+    start = time.perf_counter()
+    try:
+        ok = get_client(MISTRAL_API_KEY).ping()
+    except Exception as e:
+        if not is_throttled(e):
+            raise
+        # A 429 means Mistral is up and answering; the rate limit is the scheduler's business
+        return True, None
+    return ok, time.perf_counter() - start
+
+def probe_upstream():
+    """The one upstream probe, shared by the health averages and the circuit breaker.
+    
+    It queues behind every other call and counts against the rate limit like
+    them. Returns None when our own queue kept it past the deadline.
+    """
+    try:
+        ok, seconds = upstream_scheduler.call(ping_upstream, priority=PROBE, timeout=UPSTREAM_DEADLINE)
+    except DeadlineExceeded:
+        return None
+    if ok:
+        upstream_breaker.record_success()
+    return ok, seconds
+
+# Probes Mistral every SMARTSPEND_HEALTH_INTERVAL seconds in the background; /api/status
+# reports the averages and categorizations skip Mistral while it looks unhealthy.
+# It starts in each worker process on first use (see warm_up).
+upstream_health = prober_from_env(probe_upstream, max_latency=UPSTREAM_DEADLINE)
+
 def get_category_from_mistral(description):
     """Calls Mistral AI API to categorize an expense description."""
+    return categorization_engine.categorize(description)[0]
+
+def fetch_upstream_category(description, priority=CATEGORIZE):
+    """Asks Mistral, sharing the call with concurrent requests for the same description.
     
+    Flights are shared only within a priority, so a single categorization
+    never waits behind a bulk-lane call for the same merchant.
+    """
+    return category_flights.do((priority, normalize_description(description)), _fetch_upstream_category,
+                               description, priority)
+
+def fetch_bulk_category(description):
+    """fetch_upstream_category for batches and imports, in the lower-priority bulk lane."""
+    return fetch_upstream_category(description, BULK)
+
+def _fetch_upstream_category(description, priority):
+    """Asks Mistral, reporting the outcome to the circuit breaker and caching answers."""
+    try:
+        category = ask_mistral_category(description, priority)
+    except DeadlineExceeded as e:
+        # Our own queue or rate limit, not a sign the upstream is down
+        print(f"{str(e)}. Using local categorization.")
+        return None
+    if category is None:
+        upstream_breaker.record_failure()
+    else:
+        upstream_breaker.record_success()
+        category_cache.set(description, category)
+        label_log.append(description, category)
+    return category
+
+def upstream_unavailable():
+    """Why Mistral can't be asked right now, or None if it can."""
     if not MISTRAL_API_KEY:
-        print("Mistral API key not found. Using local categorization.")
-        return get_default_category(description)
-    
+        return 'offline'
+    # Asked first, since this also starts the prober that can close the breaker
+    reason = upstream_health.unavailable()
+    if reason:
+        return reason
+    if not upstream_breaker.allow():
+        return 'circuit_open'
+    return None
+
+# Cache, merchant dictionary, keyword rules, local model, then Mistral; the first tier to answer wins.
+# Single requests wait for Mistral at most LATENCY_BUDGET seconds.
+categorization_engine = CategorizationEngine([
+    CacheTier(category_cache),
+    MerchantTier(merchant_dict),
+    RulesTier(),
+    ModelTier(local_model, MODEL_CONFIDENCE),
+    # fetch_upstream_category caches answers itself, so a late reply still helps next time
+    LLMTier(fetch_upstream_category, available=upstream_unavailable, pool=upstream_pool, budget=LATENCY_BUDGET,
+            bulk_fetch=fetch_bulk_category, bulk_pool=bulk_pool)
+])
+
+def categorize_upstream_batch(descriptions, priority=CATEGORIZE):
+    """Categorizes a micro-batch in one Mistral call; RETRY marks items the reply didn't cover."""
+    client = get_client(MISTRAL_API_KEY)
+    if len(descriptions) == 1:
+        return [upstream_scheduler.call(client.categorize, descriptions[0],
+                                        priority=priority, timeout=UPSTREAM_DEADLINE)]
+    categories = upstream_scheduler.call(client.categorize_many, descriptions,
+                                         priority=priority, timeout=UPSTREAM_DEADLINE)
+    return [RETRY if category is None else category for category in categories]
+
+# One batcher per lane: single requests never wait behind a batch's items,
+# and the scheduler hands their prompts tokens first
+category_batchers = {
+    priority: MicroBatcher(functools.partial(categorize_upstream_batch, priority=priority),
+                           window=LLM_BATCH_WINDOW_MS / 1000, max_items=LLM_BATCH_SIZE,
+                           max_concurrency=BATCH_CONCURRENCY)
+    for priority in (CATEGORIZE, BULK)
+}
+BATCH_LANES = {CATEGORIZE: 'single', BULK: 'bulk'}
+
+def micro_batch_stats():
+    return {BATCH_LANES[priority]: batcher.stats() for priority, batcher in category_batchers.items()}
+
+def ask_mistral_category(description, priority=CATEGORIZE):
+    """Asks Mistral for a category; returns None if the API gives no usable answer."""
     try:
-        MISTRAL_ENDPOINT = "https://api.mistral.ai/v1/chat/completions"
-        HEADERS = {
-            "Authorization": f"Bearer {MISTRAL_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "mistral-tiny",
-            "messages": [
-                {"role": "system", "content": "You are an expense categorization assistant. Categorize expenses into one of these categories: food, transportation, housing, utilities, entertainment, shopping, travel, health, education, or other. Reply with just the category name in lowercase."},
-                {"role": "user", "content": f"Categorize this expense: {description}"}
-            ],
-            "temperature": 0.3
-        }
-        response = requests.post(MISTRAL_ENDPOINT, json=payload, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-
-        response_data = response.json()
-        if "choices" in response_data and response_data["choices"]:
-            category = response_data["choices"][0].get("message", {}).get("content", "other").strip().lower()
-            common_categories = ["food", "transportation", "housing", "utilities", "entertainment", 
-                               "shopping", "travel", "health", "education", "other"]
-            for c in common_categories:
-                if c in category:
-                    return c
-            return "other"
-        print("No valid response from API. Using local categorization.")
-        return get_default_category(description)
+        category = category_batchers[priority].submit(description).result()
+        if category is RETRY:
+            # The batched reply was malformed for this item; ask for it on its own
+            category = upstream_scheduler.call(get_client(MISTRAL_API_KEY).categorize, description,
+                                               priority=priority, timeout=UPSTREAM_DEADLINE)
+        if category is None:
+            print("No valid response from API. Using local categorization.")
+        return category
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Error with API: {str(e)}. Using local categorization.")
-        return get_default_category(description)
+        return None
 
 def get_query_response(query):
     """Handles general queries via Mistral API."""
@@ -59,60 +319,141 @@ def get_query_response(query):
     if not MISTRAL_API_KEY:
         return "I'm currently in offline mode. For financial advice, please make sure you're tracking your expenses regularly and categorizing them properly to understand your spending patterns."
     
+    cached = answer_cache.get(query)
+    if cached is not None:
+        return cached
+    
     try:
-        MISTRAL_ENDPOINT = "https://api.mistral.ai/v1/chat/completions"
-        HEADERS = {
-            "Authorization": f"Bearer {MISTRAL_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "mistral-tiny",
-            "messages": [
-                {"role": "system", "content": "You are an expense management assistant. Provide helpful, concise responses about expense categories, finance management, and budgeting."},
-                {"role": "user", "content": query}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 150
-        }
-        response = requests.post(MISTRAL_ENDPOINT, json=payload, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-
-        response_data = response.json()
-        if "choices" in response_data and response_data["choices"]:
-            return response_data["choices"][0].get("message", {}).get("content", "").strip()
+        key = normalize_question(query) or " ".join(query.casefold().split())
+        answer = query_flights.do(key, ask_mistral_answer, query)
+        if answer is not None:
+            answer_cache.set(query, answer)
+            return answer
         return "I couldn't process your query. Please try again."
     except Exception as e:
         print(f"Error processing query: {str(e)}")
         return "I'm having trouble connecting to my knowledge base. Please try again later."
 
-def get_default_category(description):
-    """Local fallback categorization when API is unavailable."""
-    desc = description.lower()
-    if "restaurant" in desc or "food" in desc or "dinner" in desc or "lunch" in desc or "breakfast" in desc or "coffee" in desc:
-        return "food"
-    elif "uber" in desc or "taxi" in desc or "bus" in desc or "train" in desc or "gas" in desc or "car" in desc:
-        return "transportation"
-    elif "rent" in desc or "mortgage" in desc or "home" in desc:
-        return "housing"
-    elif "electricity" in desc or "water" in desc or "bill" in desc or "internet" in desc or "phone" in desc:
-        return "utilities"
-    elif "movie" in desc or "netflix" in desc or "spotify" in desc or "concert" in desc or "game" in desc:
-        return "entertainment"
-    elif "amazon" in desc or "mall" in desc or "store" in desc or "buy" in desc or "purchase" in desc:
-        return "shopping"
-    elif "doctor" in desc or "medicine" in desc or "hospital" in desc or "health" in desc:
-        return "health"
-    elif "course" in desc or "book" in desc or "tuition" in desc or "class" in desc or "school" in desc:
-        return "education"
-    elif "hotel" in desc or "flight" in desc or "vacation" in desc or "trip" in desc or "travel" in desc:
-        return "travel" 
-    else:
-        return "other"
+def ask_mistral_answer(query):
+    return upstream_scheduler.call(get_client(MISTRAL_API_KEY).answer, query,
+                                   priority=QUERY, timeout=UPSTREAM_DEADLINE)
+
+def stream_query_response(query):
+    """Yields the answer to a query in pieces as Mistral generates it."""
+    
+    if not MISTRAL_API_KEY:
+        yield "I'm currently in offline mode. For financial advice, please make sure you're tracking your expenses regularly and categorizing them properly to understand your spending patterns."
+        return
+    
+    cached = answer_cache.get(query)
+    if cached is not None:
+        yield cached
+        return
+    
+    tokens = []
+    try:
+        for token in upstream_scheduler.stream(get_client(MISTRAL_API_KEY).stream_answer, query,
+                                               priority=QUERY, timeout=UPSTREAM_DEADLINE):
+            tokens.append(token)
+            yield token
+    except Exception as e:
+        print(f"Error streaming query: {str(e)}")
+        if not tokens:
+            yield "I'm having trouble connecting to my knowledge base. Please try again later."
+        return
+    if not tokens:
+        yield "I couldn't process your query. Please try again."
+        return
+    # Only complete answers are cached
+    answer_cache.set(query, "".join(tokens))
+
+def current_user():
+    """The ledger partition for this request, keyed by its X-Ledger-Token header.
+    
+    Without a token this is the shared default ledger. A token that
+    new_token() couldn't have made is rejected rather than treated as a name.
+    """
+    token = request.headers.get('X-Ledger-Token')
+    if token is None:
+        return DEFAULT_USER
+    key = token_key(token)
+    if key is None:
+        abort(make_response(jsonify({'error': 'Invalid X-Ledger-Token'}), 401))
+    return key
+
+def is_iso_date(value):
+    try:
+        iso_date(value)
+    except ValueError:
+        return False
+    return True
+
+def expense_error(expense, partial=False):
+    """Why an expense from a request body can't be saved, or None if it can.
+    
+    With `partial`, only the fields present are checked (for updates).
+    """
+    if not partial or 'description' in expense:
+        if not (isinstance(expense.get('description'), str) and expense['description']):
+            return 'Each expense needs a description'
+    amount = expense.get('amount')
+    if amount is not None and (isinstance(amount, bool) or not isinstance(amount, (int, float))):
+        return 'Amounts must be numbers'
+    if amount is not None and not 0 <= amount < float('inf'):
+        # Ledger amounts are spending; a negative one would net against it in the summary
+        return 'Amounts must be positive spending'
+    if (expense.get('date') is not None or (partial and 'date' in expense)) and not is_iso_date(expense['date']):
+        return 'Dates must be ISO dates (YYYY-MM-DD)'
+    if (expense.get('category') or (partial and 'category' in expense)) and expense['category'] not in CATEGORIES:
+        return f'Category must be one of: {", ".join(CATEGORIES)}'
+    return None
+
+def sse_event(data, event=None):
+    """Formats one Server-Sent Event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def categorize_many(descriptions):
+    """Categorizes distinct descriptions; returns {description: (category, source)}."""
+    results = categorization_engine.categorize_many(descriptions)
+    record_categorizations(results.values())
+    return {description: (category, source) for description, (category, source, _) in results.items()}
+
+@app.template_global()
+def asset_url(name):
+    """URL of the fingerprinted copy of static/<name>, for templates."""
+    built_name = built_asset_names.get(name)
+    return f"/static/{BUILD_DIR_NAME}/{built_name}" if built_name else f"/static/{name}"
+
+@app.template_global()
+def rules_url():
+    """Versioned URL of the rule table, so browsers can cache it until the rules change."""
+    return f"/api/rules?v={RULES['version']}"
+
+def accepts_encoding(encoding):
+    return request.accept_encodings[encoding] > 0
 
 @app.route('/static/<path:path>')
 def serve_static(path):
-    return send_from_directory('static', path)
+    directory, _, name = path.rpartition('/')
+    asset = static_assets.get(name) if directory == BUILD_DIR_NAME else None
+    if asset is None:
+        # Unfingerprinted names may change content, so browsers revalidate them (ETag/304)
+        return send_from_directory('static', path, max_age=0)
+    
+    encoding, body = asset.negotiate(accepts_encoding)
+    # One ETag per encoding, since the bytes differ
+    etag = f"{asset.etag}-{encoding}" if encoding else asset.etag
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetypes.guess_type(asset.name)[0] or 'application/octet-stream')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/')
 def index():
@@ -124,15 +465,222 @@ def api_categorize():
     
     if not data or 'description' not in data:
         return jsonify({'error': 'No expense description provided'}), 400
+    if not isinstance(data['description'], str):
+        return jsonify({'error': 'Description must be a string'}), 400
+    if data.get('save'):
+        # Checked before categorizing, so a bad expense costs no upstream call
+        error = expense_error(dict(data, category=None))
+        if error:
+            return jsonify({'error': error}), 400
         
     description = data['description']
-    category = get_category_from_mistral(description)
+    budget = LATENCY_BUDGET
+    if isinstance(data.get('budget_ms'), (int, float)):
+        budget = min(max(data['budget_ms'] / 1000, 0), LATENCY_BUDGET * 10)
+    category, source, reason = categorization_engine.categorize(description, budget)
+    record_categorizations([(category, source, reason)])
     
-    return jsonify({
+    result = {
         'category': category,
-        'description': description
+        'description': description,
+        'source': source
+    }
+    if reason:
+        result['fallback_reason'] = reason
+    if data.get('save'):
+        result['id'] = ledger.add({
+            'description': description,
+            'amount': data.get('amount'),
+            'date': data.get('date'),
+            'category': category,
+            'source': source
+        }, current_user())
+    return jsonify(result)
+
+@app.route('/api/categorize/batch', methods=['POST'])
+def api_categorize_batch():
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('descriptions'), list):
+        return jsonify({'error': 'No expense descriptions provided'}), 400
+    
+    descriptions = data['descriptions']
+    if not all(isinstance(d, str) for d in descriptions):
+        return jsonify({'error': 'Descriptions must be strings'}), 400
+    if len(descriptions) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} descriptions per batch'}), 413
+    
+    unique = list(dict.fromkeys(descriptions))
+    results = categorize_many(unique)
+    
+    return jsonify({
+        'results': [
+            {'description': d, 'category': results[d][0], 'source': results[d][1]}
+            for d in descriptions
+        ],
+        'count': len(descriptions),
+        'unique': len(unique)
     })
 
+@app.route('/api/import', methods=['POST'])
+def api_import():
+    """Streams categorized transactions back as NDJSON while the statement uploads.
+    
+    Send the file as the raw request body (or as a multipart "file" field).
+    The format comes from ?format=csv|ofx, the file extension, or the content.
+    """
+    # Only a multipart body is parsed into request.files; touching it for any
+    # other type (e.g. curl --data-binary's form encoding) would consume the body
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    if upload:
+        stream, filename = upload.stream, upload.filename
+    else:
+        stream, filename = request.stream, request.args.get('filename', '')
+    
+    fmt = request.args.get('format')
+    if not fmt and filename:
+        extension = os.path.splitext(filename)[1].lower().lstrip('.')
+        fmt = extension if extension in ('csv', 'ofx', 'qfx') else None
+    transactions = parse_statement(stream, fmt)
+    save = request.args.get('save') in ('1', 'true')
+    user_id = current_user()
+    
+    def generate():
+        imported = skipped = credits = 0
+        try:
+            for chunk in chunked(transactions, IMPORT_CHUNK_SIZE):
+                results = categorize_many(list(dict.fromkeys(t['description'] for t in chunk)))
+                rows = []
+                for transaction in chunk:
+                    category, source = results[transaction['description']]
+                    rows.append(dict(transaction, category=category, source=source))
+                if save:
+                    # Money in isn't spending, and rows whose date couldn't be parsed
+                    # can't be rolled up; both are streamed back but not saved
+                    expenses = [expense for expense in map(to_expense, rows) if expense is not None]
+                    credits += len(rows) - len(expenses)
+                    savable = [e for e in expenses if e['date'] is None or is_iso_date(e['date'])]
+                    ledger.add_many(savable, user_id)
+                    skipped += len(expenses) - len(savable)
+                imported += len(chunk)
+                lines = [json.dumps(row) for row in rows]
+                yield "\n".join(lines) + "\n"
+        except (StatementError, csv.Error) as e:
+            yield json.dumps({'error': str(e), 'imported': imported}) + "\n"
+            return
+        done = {'done': True, 'imported': imported}
+        if save:
+            done.update(skipped=skipped, credits=credits)
+        yield json.dumps(done) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/ledgers', methods=['POST'])
+def api_new_ledger():
+    """Starts a private ledger; send the returned token as X-Ledger-Token to use it."""
+    return jsonify({'token': new_token()}), 201
+
+@app.route('/api/expenses', methods=['POST'])
+def api_add_expenses():
+    """Saves one expense or a list of them ({"expenses": [...]}) to the ledger.
+    
+    Expenses without a category are categorized first.
+    """
+    data = request.get_json()
+    expenses = data.get('expenses', [data]) if isinstance(data, dict) else None
+    
+    if not isinstance(expenses, list) or not all(isinstance(e, dict) for e in expenses):
+        return jsonify({'error': 'Each expense needs a description'}), 400
+    if len(expenses) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} expenses per request'}), 413
+    error = next(filter(None, map(expense_error, expenses)), None)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    uncategorized = list(dict.fromkeys(e['description'] for e in expenses if not e.get('category')))
+    results = categorize_many(uncategorized) if uncategorized else {}
+    rows = []
+    for expense in expenses:
+        category, source = expense.get('category'), 'user'
+        if not category:
+            category, source = results[expense['description']]
+        rows.append({
+            'description': expense['description'],
+            'amount': expense.get('amount'),
+            'date': expense.get('date'),
+            'category': category,
+            'source': source
+        })
+    
+    saved = ledger.add_many(rows, current_user())
+    return jsonify({'saved': saved}), 201
+
+@app.route('/api/expenses', methods=['GET'])
+def api_list_expenses():
+    """Lists saved expenses newest first, filtered by ?category=, ?start= and ?end=.
+    
+    Pages hold ?limit= rows (default 50); pass next_cursor back as ?cursor=.
+    """
+    try:
+        expenses, next_cursor = ledger.list(
+            current_user(),
+            category=request.args.get('category'),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'expenses': expenses, 'next_cursor': next_cursor})
+
+@app.route('/api/expenses/<int:expense_id>', methods=['PATCH'])
+def api_update_expense(expense_id):
+    """Corrects a saved expense, e.g. {"category": "travel"}; the rollups follow."""
+    data = request.get_json()
+    
+    if not isinstance(data, dict) or not data:
+        return jsonify({'error': 'No changes provided'}), 400
+    error = expense_error(data, partial=True)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    expense = ledger.update(expense_id, data, current_user())
+    if expense is None:
+        return jsonify({'error': 'Expense not found'}), 404
+    return jsonify(expense)
+
+@app.route('/api/expenses/<int:expense_id>', methods=['DELETE'])
+def api_delete_expense(expense_id):
+    expense = ledger.delete(expense_id, current_user())
+    if expense is None:
+        return jsonify({'error': 'Expense not found'}), 404
+    return jsonify(expense)
+
+@app.route('/api/summary', methods=['GET'])
+def api_summary():
+    """Spending per category by month and week of ?year= (default: this year), and year to date."""
+    year = request.args.get('year', '')
+    if year and not year.isdigit():
+        return jsonify({'error': 'Year must be a number'}), 400
+    return jsonify(ledger.summary(current_user(), year or None))
+
+@app.route('/api/rules', methods=['GET'])
+def api_rules():
+    """The compiled keyword rules (see KeywordMatcher.export), ETag'd by version."""
+    if request.if_none_match.contains_weak(RULES['version']):
+        response = Response(status=304)
+    else:
+        response = Response(RULES_JSON, mimetype='application/json')
+    response.set_etag(RULES['version'])
+    # A ?v= URL names one version of the rules, so it can be cached for good
+    if request.args.get('v') == RULES['version']:
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/query', methods=['POST'])
 def api_query():
     data = request.get_json()
@@ -148,14 +696,86 @@ def api_query():
         'query': query
     })
 
+@app.route('/api/query/stream', methods=['POST'])
+def api_query_stream():
+    data = request.get_json()
+    
+    if not data or 'query' not in data:
+        return jsonify({'error': 'No query provided'}), 400
+    
+    query = data['query']
+    
+    def events():
+        for token in stream_query_response(query):
+            yield sse_event({'token': token})
+        yield sse_event({'query': query}, event='done')
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/status', methods=['GET'])
 def api_status():
+    # Everything here is read from memory; nothing calls Mistral
     has_api_key = bool(MISTRAL_API_KEY)
+    health = upstream_health.stats() if has_api_key else None
     
     return jsonify({
         'status': 'online',
-        'api_available': has_api_key
+        'api_available': has_api_key,
+        'upstream_healthy': has_api_key and health['healthy'],
+        'upstream_health': health,
+        'cache': category_cache.stats(),
+        'answer_cache': answer_cache.stats(),
+        'circuit_breaker': upstream_breaker.stats(),
+        'upstream_scheduler': upstream_scheduler.stats(),
+        'micro_batches': micro_batch_stats(),
+        'local_model': local_model is not None,
+        'merchant_dict': len(merchant_dict) if merchant_dict is not None else None,
+        'categorization': categorization_engine.stats(),
+        'single_flight': {
+            'categorize': category_flights.stats(),
+            'query': query_flights.stats()
+        }
     })
 
+# Set by warm_up(); until then /api/health/ready answers 503
+worker_ready = threading.Event()
+
+def preload():
+    """Work done once in the parent of a pre-forking server, so workers share the result.
+    
+    Importing this module already compiles the keyword rules, loads the local
+    model, maps the merchant dictionary and builds the static assets; this
+    compiles the page template too.
+    """
+    app.jinja_env.get_template('index.html')
+
+def warm_up():
+    """Readies this process for traffic: opens Mistral connections and starts the health prober."""
+    if MISTRAL_API_KEY:
+        get_client(MISTRAL_API_KEY).warm(WARM_CONNECTIONS)
+        upstream_health.start()
+    worker_ready.set()
+
+@app.route('/api/health/live', methods=['GET'])
+def api_health_live():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({'status': 'alive', 'pid': os.getpid()})
+
+@app.route('/api/health/ready', methods=['GET'])
+def api_health_ready():
+    """Readiness: warmed up, so a load balancer may send traffic here."""
+    if not worker_ready.is_set():
+        return jsonify({'status': 'starting', 'pid': os.getpid()}), 503
+    return jsonify({'status': 'ready', 'pid': os.getpid()})
+
+@app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
+    # Development server; for production use gunicorn -c gunicorn.conf.py main:app
+    warm_up()
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
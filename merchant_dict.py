@@ -0,0 +1,247 @@
+"""Merchant -> category dictionary compiled into a memory-mapped sorted array.
+
+Bank descriptions are mostly merchant names ("AMZN MKTP US*2K3", "SQ *BLUE
+BOTTLE #12", "WALMART #1234") that no keyword list covers. The `build`
+command reads a CSV of merchant,category rows (millions are fine) and
+writes one file. The file holds normalized merchant names, sorted, each
+tagged with a category index, behind an array of offsets and a table of
+where each two-byte prefix starts. The API maps it read-only, so every
+worker process shares the same pages through the OS page cache instead of
+each holding a dict. A lookup is a few binary searches, each narrowed by
+the prefix table to the keys sharing its first letters, and takes
+microseconds.
+
+Names and descriptions are normalized the same way: lower-cased
+alphanumeric tokens with purely numeric ones (store and terminal numbers)
+and leading payment-processor prefixes ("SQ *", "TST*", "PAYPAL *")
+dropped. A description matches the longest merchant whose tokens start it,
+but only if that merchant uses up every remaining word: tokens left over
+must contain a digit, like reference codes ("US*2K3", "F1234"). So
+"SUBWAY 00123" is Subway, while "Subway ride to work" is free text and left
+to the keyword rules. Names shorter than MIN_KEY_LENGTH aren't stored.
+
+Build with: python merchant_dict.py build merchants.csv [--output PATH]
+"""
+import argparse
+import csv
+import json
+import mmap
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_left
+
+from categorizer import CATEGORIES
+
+DEFAULT_MERCHANT_DICT = os.path.join("data", "merchants.bin")
+MAGIC = b"SSMERCH1"
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Leading tokens that are card networks, processors or transaction types rather than merchants
+NOISE_PREFIXES = frozenset((
+    "sq", "tst", "sp", "pp", "paypal", "pos", "ach", "debit", "credit", "card", "checkcard",
+    "purchase", "visa", "mc", "recurring", "pmt", "payment", "dd", "bill", "web", "ext",
+))
+
+# Shorter normalized names match too much free text to be worth storing
+MIN_KEY_LENGTH = 3
+
+# Entries in the two-byte prefix table
+PREFIXES = 1 << 16
+
+
+def merchant_tokens(text):
+    """Normalized tokens of a merchant name or bank description."""
+    tokens = [token for token in _TOKEN_RE.findall(text.casefold().replace("'", "").replace("’", ""))
+              if not token.isdigit()]
+    start = 0
+    while start < len(tokens) - 1 and tokens[start] in NOISE_PREFIXES:
+        start += 1
+    return tokens[start:]
+
+
+def _prefix(key):
+    return key[0] << 8 | (key[1] if len(key) > 1 else 0)
+
+
+class _Keys:
+    """Sequence view of the keys in the mapped file, for bisect."""
+
+    def __init__(self, data, offsets):
+        self._data = data
+        # File positions of each record, plus the end of the last one
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        # Each record is one category byte followed by the key
+        return self._data[self._offsets[i] + 1:self._offsets[i + 1]]
+
+
+class MerchantDictionary:
+    """Read-only view of a compiled merchant dictionary file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a merchant dictionary")
+        header_size = int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 4], "little")
+        header_end = len(MAGIC) + 4 + header_size
+        header = json.loads(self._mmap[len(MAGIC) + 4:header_end])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was built on a {header['byteorder']}-endian machine")
+        self.categories = header["categories"]
+        self.count = header["count"]
+        offsets_start = header_end + (-header_end % 4)
+        prefixes_start = offsets_start + 4 * (self.count + 1)
+        # Zero-copy views of the mapping; nothing is read until a lookup touches it
+        self._offsets = memoryview(self._mmap)[offsets_start:prefixes_start].cast("I")
+        self._prefixes = memoryview(self._mmap)[prefixes_start:prefixes_start + 4 * (PREFIXES + 1)].cast("I")
+        self._keys = _Keys(self._mmap, self._offsets)
+
+    def __len__(self):
+        return self.count
+
+    def _category(self, i):
+        return self.categories[self._mmap[self._offsets[i]]]
+
+    def _longest_prefix(self, tokens, min_tokens=1):
+        """Category of the longest key made of tokens[:k] for some k >= min_tokens, or None."""
+        keys = self._keys
+        best = None
+        key = tokens[0]
+        # Every key this search can reach shares the first byte of the first token
+        lo = self._prefixes[_prefix(key)]
+        hi = self._prefixes[(key[0] + 1) << 8]
+        for n, token in enumerate(tokens):
+            if n:
+                key = key + b" " + token
+            i = bisect_left(keys, key, lo, hi)
+            if i == hi:
+                break
+            found = keys[i]
+            if found == key:
+                if n + 1 >= min_tokens:
+                    best = self._category(i)
+            elif not found.startswith(key + b" "):
+                # Space sorts before every token character, so a longer key
+                # starting with this one would have been the next one
+                break
+            lo = i
+        return best
+
+    def lookup(self, description):
+        """Returns the category of the merchant a description names, or None."""
+        tokens = merchant_tokens(description)
+        # The match has to cover every word; only codes may follow it
+        words = max((n + 1 for n, token in enumerate(tokens) if token.isalpha()), default=1)
+        tokens = [token.encode("utf-8") for token in tokens]
+        return self._longest_prefix(tokens, words) if tokens else None
+
+    def close(self):
+        # The views pin the mapping; it can only be closed once they are released
+        self._offsets.release()
+        self._prefixes.release()
+        self._mmap.close()
+
+
+def build(rows, path):
+    """Compiles (merchant, category) pairs into a dictionary file; later rows win. Returns the entry count."""
+    entries = {}
+    skipped = 0
+    index = {category: i for i, category in enumerate(CATEGORIES)}
+    for merchant, category in rows:
+        key = " ".join(merchant_tokens(merchant))
+        category = category.strip().lower()
+        if len(key) < MIN_KEY_LENGTH or category not in index:
+            skipped += 1
+            continue
+        entries[key.encode("utf-8")] = index[category]
+
+    keys = sorted(entries)
+    header = json.dumps({"categories": list(CATEGORIES), "count": len(keys),
+                         "byteorder": sys.byteorder}).encode("utf-8")
+    header_end = len(MAGIC) + 4 + len(header)
+    padding = -header_end % 4
+    # Records start right after the offsets array and prefix table; offsets are file positions
+    position = header_end + padding + 4 * (len(keys) + 1) + 4 * (PREFIXES + 1)
+    offsets = array("I", [position])
+    for key in keys:
+        position += 1 + len(key)
+        if position >= 2 ** 32:
+            raise ValueError("Merchant dictionary too large for 32-bit offsets")
+        offsets.append(position)
+    # prefixes[p] is the index of the first key whose two-byte prefix is >= p
+    prefixes = array("I", [len(keys)] * (PREFIXES + 1))
+    p = 0
+    for i, key in enumerate(keys):
+        while p <= _prefix(key):
+            prefixes[p] = i
+            p += 1
+    tmp = path + ".tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(4, "little") + header + b"\0" * padding)
+        offsets.tofile(f)
+        prefixes.tofile(f)
+        for key in keys:
+            f.write(bytes((entries[key],)) + key)
+    # Replace atomically, so running processes keep their old mapping intact
+    os.replace(tmp, path)
+    if skipped:
+        print(f"Skipped {skipped} rows with a name under {MIN_KEY_LENGTH} characters or an unknown category")
+    return len(keys)
+
+
+def read_csv(path):
+    """Yields (merchant, category) from a CSV file, skipping a merchant,category header."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or (row[0].strip().lower(), row[1].strip().lower()) == ("merchant", "category"):
+                continue
+            yield row[0], row[1]
+
+
+def load_merchant_dict(path=None):
+    """Maps the compiled dictionary, or returns None if there isn't one."""
+    path = path or os.environ.get("SMARTSPEND_MERCHANT_DICT", DEFAULT_MERCHANT_DICT)
+    if not os.path.exists(path):
+        return None
+    try:
+        return MerchantDictionary(path)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Could not load merchant dictionary from {path}: {str(e)}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merchant dictionary")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build_parser = subcommands.add_parser("build", help="compile a merchant,category CSV")
+    build_parser.add_argument("csv")
+    build_parser.add_argument("--output", help="output path (default: $SMARTSPEND_MERCHANT_DICT)")
+    lookup_parser = subcommands.add_parser("lookup", help="look up descriptions")
+    lookup_parser.add_argument("descriptions", nargs="+")
+    lookup_parser.add_argument("--dict", help="dictionary path (default: $SMARTSPEND_MERCHANT_DICT)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        path = args.output or os.environ.get("SMARTSPEND_MERCHANT_DICT", DEFAULT_MERCHANT_DICT)
+        count = build(read_csv(args.csv), path)
+        print(f"Wrote {count} merchants to {path} ({os.path.getsize(path)} bytes)")
+    else:
+        dictionary = load_merchant_dict(args.dict)
+        if dictionary is None:
+            raise SystemExit("No merchant dictionary found; run the build command first")
+        for description in args.descriptions:
+            print(f"{dictionary.lookup(description) or '-':<15}{description}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Result for an item the batch call couldn't answer; the caller should retry it on its own
+RETRY = object()
+
+
+class MicroBatcher:
+    """Groups items submitted from many threads into batched calls.
+
+    The first item starts a `window`-second timer; the batch is sent when it
+    expires or `max_items` are waiting, whichever comes first. `fn` takes a
+    list of items and returns a list of results in the same order (RETRY for
+    items it couldn't answer). Up to `max_concurrency` batches run at once.
+    """
+
+    def __init__(self, fn, window=0.005, max_items=16, max_concurrency=8):
+        self.fn = fn
+        self.window = window
+        self.max_items = max_items
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._pending = []
+        self._pid = None
+        self._executor = None
+        self._stats = {"batches": 0, "items": 0, "largest": 0}
+
+    def _start(self):
+        """Starts the collector thread; again after a fork, since threads don't survive it."""
+        self._pid = os.getpid()
+        self._pending = []
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="micro-batch")
+        threading.Thread(target=self._collect, daemon=True, name="micro-batcher").start()
+
+    def submit(self, item):
+        """Queues an item and returns a Future for its result."""
+        future = Future()
+        with self._cond:
+            if self._pid != os.getpid():
+                self._start()
+            self._pending.append((item, future))
+            self._cond.notify()
+        return future
+
+    def _collect(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending[:self.max_items], self._pending[self.max_items:]
+                self._stats["batches"] += 1
+                self._stats["items"] += len(batch)
+                self._stats["largest"] = max(self._stats["largest"], len(batch))
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        try:
+            results = self.fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch function returned {len(results)} results for {len(batch)} items")
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats, pending=len(self._pending))
+        stats["average"] = round(stats["items"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
@@ -0,0 +1,343 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:  # only needed by AsyncMistralClient
+    aiohttp = None
+
+from categorizer import CATEGORIES
+from metrics import Gauge, Histogram
+
+DEFAULT_ENDPOINT = "https://api.mistral.ai/v1/chat/completions"
+DEFAULT_MODEL = "mistral-tiny"
+
+CATEGORIZE_SYSTEM_PROMPT = "You are an expense categorization assistant. Categorize expenses into one of these categories: food, transportation, housing, utilities, entertainment, shopping, travel, health, education, or other. Reply with just the category name in lowercase."
+BATCH_CATEGORIZE_SYSTEM_PROMPT = "You are an expense categorization assistant. Categorize each numbered expense into one of these categories: food, transportation, housing, utilities, entertainment, shopping, travel, health, education, or other. Reply with only a JSON object mapping each number to its category name in lowercase, like {\"1\": \"food\", \"2\": \"travel\"}."
+QUERY_SYSTEM_PROMPT = "You are an expense management assistant. Provide helpful, concise responses about expense categories, finance management, and budgeting."
+
+UPSTREAM_LATENCY = Histogram("smartspend_upstream_request_duration_seconds",
+                             "Mistral chat-completion latency by operation and outcome",
+                             ("operation", "outcome"))
+UPSTREAM_IN_FLIGHT = Gauge("smartspend_upstream_requests_in_flight",
+                           "Mistral requests currently waiting on the API", ("operation",))
+
+_TIMEOUT_ERRORS = (requests.Timeout, asyncio.TimeoutError) + ((aiohttp.ServerTimeoutError,) if aiohttp else ())
+_HTTP_ERRORS = (requests.HTTPError,) + ((aiohttp.ClientResponseError,) if aiohttp else ())
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+@contextmanager
+def observe_upstream(operation):
+    """Records one upstream call's latency under outcome ok, timeout, http_error, error or cancelled."""
+    outcome = "error"
+    UPSTREAM_IN_FLIGHT.inc(operation)
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    except _TIMEOUT_ERRORS:
+        outcome = "timeout"
+        raise
+    except _HTTP_ERRORS:
+        outcome = "http_error"
+        raise
+    except GeneratorExit:
+        # A streaming reply the caller stopped reading
+        outcome = "cancelled"
+        raise
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, operation, outcome)
+        UPSTREAM_IN_FLIGHT.dec(operation)
+
+
+def parse_category(content):
+    """Maps a free-text model reply onto one of the known categories."""
+    content = content.strip().lower()
+    for category in CATEGORIES:
+        if category in content:
+            return category
+    return "other"
+
+
+def build_payload(model, system_prompt, user_message, temperature, max_tokens=None, json_mode=False):
+    """Builds a chat-completions request body."""
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ],
+        "temperature": temperature
+    }
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+    if json_mode:
+        payload["response_format"] = {"type": "json_object"}
+    return payload
+
+
+def batch_prompt(descriptions):
+    """Numbered user message for categorizing several descriptions at once."""
+    lines = (f"{i}. {' '.join(description.split())}" for i, description in enumerate(descriptions, 1))
+    return "Categorize these expenses:\n" + "\n".join(lines)
+
+
+def parse_batch_categories(content, count):
+    """Reads a batched reply into `count` categories, with None for items it doesn't answer.
+
+    Accepts {"1": "food", ...} or {"categories": ["food", ...]}; anything
+    that isn't JSON gives all None.
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return [None] * count
+    if isinstance(data, dict) and isinstance(data.get("categories"), list):
+        data = {str(i): value for i, value in enumerate(data["categories"], 1)}
+    if not isinstance(data, dict):
+        return [None] * count
+    categories = []
+    for i in range(1, count + 1):
+        value = data.get(str(i))
+        value = value.strip().lower() if isinstance(value, str) else None
+        categories.append(value if value in CATEGORIES else None)
+    return categories
+
+
+def parse_stream_line(line):
+    """Returns the content delta carried by one upstream SSE line, "" if none, or None at [DONE]."""
+    if not line.startswith(b"data:"):
+        return ""
+    data = line[len(b"data:"):].decode("utf-8").strip()
+    if data == "[DONE]":
+        return None
+    choices = json.loads(data).get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+
+def extract_content(response_data):
+    """Returns the first choice's message text, or None if the reply has no choices."""
+    if "choices" in response_data and response_data["choices"]:
+        return response_data["choices"][0].get("message", {}).get("content", "")
+    return None
+
+
+class MistralClient:
+    """Chat-completions client that keeps connections to the API alive between calls.
+
+    Settings default to the MISTRAL_API_URL, MISTRAL_MODEL, MISTRAL_POOL_SIZE,
+    MISTRAL_CONNECT_TIMEOUT and MISTRAL_READ_TIMEOUT environment variables.
+    """
+
+    def __init__(self, api_key, endpoint=None, model=None, pool_size=None,
+                 connect_timeout=None, read_timeout=None):
+        self.endpoint = endpoint or os.environ.get("MISTRAL_API_URL", DEFAULT_ENDPOINT)
+        self.model = model or os.environ.get("MISTRAL_MODEL", DEFAULT_MODEL)
+        self.pool_size = pool_size or int(os.environ.get("MISTRAL_POOL_SIZE", "10"))
+        self.timeout = (connect_timeout or _env_float("MISTRAL_CONNECT_TIMEOUT", "3.05"),
+                        read_timeout or _env_float("MISTRAL_READ_TIMEOUT", "10"))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    def chat(self, system_prompt, user_message, temperature, max_tokens=None, operation="chat", json_mode=False):
+        """Sends one chat completion and returns the decoded JSON response.
+
+        Raises requests exceptions on connection errors, timeouts and HTTP errors.
+        """
+        payload = build_payload(self.model, system_prompt, user_message, temperature, max_tokens, json_mode)
+        with observe_upstream(operation):
+            response = self.session.post(self.endpoint, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+
+    def chat_stream(self, system_prompt, user_message, temperature, max_tokens=None, operation="chat_stream"):
+        """Sends a streaming chat completion and yields content deltas as they arrive.
+
+        The read timeout applies between chunks rather than to the whole reply.
+        """
+        payload = build_payload(self.model, system_prompt, user_message, temperature, max_tokens)
+        payload["stream"] = True
+        with observe_upstream(operation), \
+                self.session.post(self.endpoint, json=payload, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                token = parse_stream_line(line)
+                if token is None:
+                    break
+                if token:
+                    yield token
+
+    def categorize(self, description):
+        """Returns the model's category for a description, or None if it gave no answer."""
+        content = extract_content(self.chat(CATEGORIZE_SYSTEM_PROMPT,
+                                            f"Categorize this expense: {description}",
+                                            temperature=0.3, operation="categorize"))
+        return None if content is None else parse_category(content)
+
+    def categorize_many(self, descriptions):
+        """Categorizes several descriptions in one request; None marks items the reply left out."""
+        content = extract_content(self.chat(BATCH_CATEGORIZE_SYSTEM_PROMPT, batch_prompt(descriptions),
+                                            temperature=0.3, max_tokens=12 * len(descriptions) + 16,
+                                            operation="categorize_batch", json_mode=True))
+        return parse_batch_categories(content, len(descriptions))
+
+    def answer(self, query):
+        """Returns the model's answer to a finance question, or None if it gave no answer."""
+        content = extract_content(self.chat(QUERY_SYSTEM_PROMPT, query,
+                                            temperature=0.7, max_tokens=150, operation="query"))
+        return None if content is None else content.strip()
+
+    def stream_answer(self, query):
+        """Yields the model's answer to a finance question token by token."""
+        return self.chat_stream(QUERY_SYSTEM_PROMPT, query, temperature=0.7, max_tokens=150,
+                                operation="query_stream")
+
+    def warm(self, connections=None):
+        """Opens up to `connections` (default: the pool size) connections to the API ahead of use.
+
+        Only TCP and TLS handshakes happen; no request is sent. Returns how many were opened.
+        """
+        pool = self.session.get_adapter(self.endpoint).poolmanager.connection_from_url(self.endpoint)
+        opened = []
+        try:
+            for _ in range(min(connections or self.pool_size, self.pool_size)):
+                conn = pool._get_conn(timeout=0)
+                opened.append(conn)
+                conn.timeout = self.timeout[0]
+                conn.connect()
+        except Exception as e:
+            print(f"Warming Mistral connections stopped: {str(e)}")
+        finally:
+            for conn in opened:
+                pool._put_conn(conn)
+        return sum(1 for conn in opened if getattr(conn, "sock", None) is not None)
+
+    def ping(self):
+        """Cheapest real request (a few-token categorization); True if the model answered."""
+        return extract_content(self.chat(CATEGORIZE_SYSTEM_PROMPT, "Categorize this expense: coffee",
+                                         temperature=0.0, max_tokens=3, operation="probe")) is not None
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncMistralClient:
+    """asyncio counterpart of MistralClient, built on aiohttp.
+
+    One instance can hold many concurrent requests; MISTRAL_ASYNC_POOL_SIZE
+    caps the number of open upstream connections. Create it from inside the
+    event loop that will use it.
+    """
+
+    def __init__(self, api_key, endpoint=None, model=None, pool_size=None,
+                 connect_timeout=None, read_timeout=None):
+        if aiohttp is None:
+            raise RuntimeError("The async client requires aiohttp (pip install aiohttp)")
+        self.endpoint = endpoint or os.environ.get("MISTRAL_API_URL", DEFAULT_ENDPOINT)
+        self.model = model or os.environ.get("MISTRAL_MODEL", DEFAULT_MODEL)
+        self.pool_size = pool_size or int(os.environ.get("MISTRAL_ASYNC_POOL_SIZE", "500"))
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=connect_timeout or _env_float("MISTRAL_CONNECT_TIMEOUT", "3.05"),
+            sock_read=read_timeout or _env_float("MISTRAL_READ_TIMEOUT", "10")
+        )
+        self.http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=timeout,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            }
+        )
+
+    async def chat(self, system_prompt, user_message, temperature, max_tokens=None, operation="chat",
+                   json_mode=False):
+        """Sends one chat completion and returns the decoded JSON response.
+
+        Raises aiohttp exceptions (or asyncio.TimeoutError) on connection
+        errors, timeouts and HTTP errors.
+        """
+        payload = build_payload(self.model, system_prompt, user_message, temperature, max_tokens, json_mode)
+        with observe_upstream(operation):
+            async with self.http.post(self.endpoint, json=payload) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def chat_stream(self, system_prompt, user_message, temperature, max_tokens=None, operation="chat_stream"):
+        """Sends a streaming chat completion and yields content deltas as they arrive."""
+        payload = build_payload(self.model, system_prompt, user_message, temperature, max_tokens)
+        payload["stream"] = True
+        with observe_upstream(operation):
+            async with self.http.post(self.endpoint, json=payload) as response:
+                response.raise_for_status()
+                async for line in response.content:
+                    token = parse_stream_line(line.strip())
+                    if token is None:
+                        break
+                    if token:
+                        yield token
+
+    async def categorize(self, description):
+        """Returns the model's category for a description, or None if it gave no answer."""
+        content = extract_content(await self.chat(CATEGORIZE_SYSTEM_PROMPT,
+                                                  f"Categorize this expense: {description}",
+                                                  temperature=0.3, operation="categorize"))
+        return None if content is None else parse_category(content)
+
+    async def categorize_many(self, descriptions):
+        """Categorizes several descriptions in one request; None marks items the reply left out."""
+        content = extract_content(await self.chat(BATCH_CATEGORIZE_SYSTEM_PROMPT, batch_prompt(descriptions),
+                                                  temperature=0.3, max_tokens=12 * len(descriptions) + 16,
+                                                  operation="categorize_batch", json_mode=True))
+        return parse_batch_categories(content, len(descriptions))
+
+    async def answer(self, query):
+        """Returns the model's answer to a finance question, or None if it gave no answer."""
+        content = extract_content(await self.chat(QUERY_SYSTEM_PROMPT, query,
+                                                   temperature=0.7, max_tokens=150, operation="query"))
+        return None if content is None else content.strip()
+
+    def stream_answer(self, query):
+        """Yields the model's answer to a finance question token by token."""
+        return self.chat_stream(QUERY_SYSTEM_PROMPT, query, temperature=0.7, max_tokens=150,
+                                operation="query_stream")
+
+    async def aclose(self):
+        await self.http.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """Returns the process-wide client for an API key, creating it on first use.
+
+    Clients are rebuilt after a fork so worker processes never share sockets.
+    """
+    key = (os.getpid(), api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = MistralClient(api_key)
+    return client
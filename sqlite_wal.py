@@ -0,0 +1,45 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ThreadConnections:
+    """Per-thread SQLite connections to one database file, in WAL mode.
+
+    A connection is never shared between threads, and one inherited across a
+    fork is replaced, since SQLite connections don't survive either. Each new
+    connection runs the `schema` statements, so the first one creates the
+    tables. Connections are in autocommit mode; use transaction() to group
+    writes.
+    """
+
+    def __init__(self, path, schema=(), timeout=10):
+        self.path = path
+        self.schema = schema
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self):
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """A write transaction on this thread's connection, rolled back if the block raises."""
+        conn = self.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
@@ -0,0 +1,254 @@
+"""Incremental bank-statement parsing (CSV and OFX/QFX).
+
+Everything here is a generator over a binary stream, so a statement is
+parsed while it is still being uploaded and memory use does not depend on
+file size.
+
+Amounts keep the statement's sign: negative for money out, positive for
+money in. to_expense() turns them into the ledger's convention, where
+spending is positive.
+"""
+import codecs
+import csv
+import re
+from datetime import datetime
+from itertools import chain, islice
+
+CHUNK_SIZE = 64 * 1024
+
+DESCRIPTION_HEADERS = ("description", "transaction description", "details", "memo", "narrative",
+                       "payee", "name", "merchant", "particulars", "reference")
+AMOUNT_HEADERS = ("amount", "transaction amount", "value", "amt")
+DEBIT_HEADERS = ("debit", "withdrawal", "withdrawals", "money out", "paid out")
+CREDIT_HEADERS = ("credit", "deposit", "deposits", "money in", "paid in")
+DATE_HEADERS = ("date", "transaction date", "posted date", "posting date", "booking date",
+                "value date", "trans date")
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%m/%d/%y", "%d/%m/%y", "%d-%m-%Y",
+                "%Y/%m/%d", "%d.%m.%Y", "%Y%m%d", "%d %b %Y", "%b %d, %Y")
+
+_AMOUNT_RE = re.compile(r"^\(?[-+]?\s*[$€£₹]?\s*[-+]?\d[\d,. ]*\)?$")
+_DECIMAL_COMMA_RE = re.compile(r",\d{1,2}$")
+
+
+class StatementError(ValueError):
+    """Raised when a statement can't be parsed."""
+
+
+def read_chunks(stream, encoding="utf-8"):
+    """Decodes a binary stream into text chunks without reading it all at once."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    first = True
+    while True:
+        data = stream.read(CHUNK_SIZE)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if first:
+            text = text.lstrip("\ufeff")
+            first = False
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def split_lines(chunks):
+    """Turns text chunks into lines (with line endings kept)."""
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + chunk).splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        yield from lines
+    if pending:
+        yield pending
+
+
+def chunked(iterable, size):
+    """Yields lists of up to `size` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_amount(value):
+    """Parses "$1,234.56", "-12.5", "(12.00)" or "1.234,56" into a float; None if it isn't an amount."""
+    value = (value or "").strip()
+    if not value or not _AMOUNT_RE.match(value):
+        return None
+    negative = value.startswith("(") or "-" in value
+    digits = re.sub(r"[^\d.,]", "", value)
+    if _DECIMAL_COMMA_RE.search(digits):
+        digits = digits.replace(".", "").replace(",", ".")
+    else:
+        digits = digits.replace(",", "")
+    try:
+        amount = float(digits)
+    except ValueError:
+        return None
+    return -amount if negative else amount
+
+
+def parse_date(value):
+    """Returns an ISO date for common statement date formats, or None."""
+    value = (value or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _find_column(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+def detect_columns(header):
+    """Works out which CSV columns hold the date, description and amount.
+
+    Known header names are used when present; otherwise `header` is taken to
+    be the first data row and the columns are inferred from its values.
+    Returns (columns, has_header).
+    """
+    normalized = [h.strip().lower() for h in header]
+    columns = {
+        "date": _find_column(normalized, DATE_HEADERS),
+        "description": _find_column(normalized, DESCRIPTION_HEADERS),
+        "amount": _find_column(normalized, AMOUNT_HEADERS),
+        "debit": _find_column(normalized, DEBIT_HEADERS),
+        "credit": _find_column(normalized, CREDIT_HEADERS),
+    }
+    if columns["description"] is not None:
+        return columns, True
+
+    # No recognizable header: guess from the values themselves
+    columns = {"date": None, "description": None, "amount": None, "debit": None, "credit": None}
+    text_columns = []
+    for i, value in enumerate(header):
+        if columns["date"] is None and parse_date(value):
+            columns["date"] = i
+        elif columns["amount"] is None and parse_amount(value) is not None:
+            columns["amount"] = i
+        elif value.strip():
+            text_columns.append(i)
+    if not text_columns:
+        raise StatementError("Could not find a description column")
+    columns["description"] = max(text_columns, key=lambda i: len(header[i]))
+    return columns, False
+
+
+def _cell(row, index):
+    return row[index].strip() if index is not None and index < len(row) else ""
+
+
+def parse_csv(chunks):
+    """Yields {"date", "description", "amount"} dicts from CSV text chunks."""
+    lines = split_lines(chunks)
+    first = next(lines, "")
+    # Semicolon- and tab-separated exports use "," as the decimal separator,
+    # so any of those in the first line beats a comma
+    delimiter = next((d for d in ";\t|" if d in first), ",")
+    reader = csv.reader(chain([first], lines), delimiter=delimiter)
+
+    header = next(reader, None)
+    if header is None:
+        return
+    columns, has_header = detect_columns(header)
+
+    for row in reader if has_header else chain([header], reader):
+        description = _cell(row, columns["description"])
+        if not description:
+            continue
+        amount = parse_amount(_cell(row, columns["amount"]))
+        if amount is None and (columns["debit"] is not None or columns["credit"] is not None):
+            credit = parse_amount(_cell(row, columns["credit"])) or 0.0
+            debit = parse_amount(_cell(row, columns["debit"])) or 0.0
+            amount = credit - abs(debit)
+        raw_date = _cell(row, columns["date"])
+        yield {
+            "date": parse_date(raw_date) or raw_date or None,
+            "description": description,
+            "amount": amount,
+        }
+
+
+def _ofx_tags(chunks):
+    """Yields (tag, value) pairs from OFX text, whether SGML (1.x) or XML (2.x)."""
+    pending = ""
+    for chunk in chunks:
+        parts = (pending + chunk).split("<")
+        pending = parts.pop()
+        for part in parts:
+            tag, _, value = part.partition(">")
+            if tag:
+                yield tag.strip().upper(), value.strip()
+    if pending:
+        tag, _, value = pending.partition(">")
+        yield tag.strip().upper(), value.strip()
+
+
+def parse_ofx(chunks):
+    """Yields {"date", "description", "amount"} dicts from OFX/QFX text chunks."""
+    transaction = None
+    for tag, value in _ofx_tags(chunks):
+        if tag == "STMTTRN":
+            transaction = {}
+        elif tag == "/STMTTRN" and transaction is not None:
+            description = transaction.get("NAME") or transaction.get("MEMO") or transaction.get("PAYEE")
+            if description:
+                if transaction.get("MEMO") and transaction.get("NAME") and transaction["MEMO"] != transaction["NAME"]:
+                    description = f"{transaction['NAME']} {transaction['MEMO']}"
+                posted = transaction.get("DTPOSTED", "")[:8]
+                yield {
+                    "date": parse_date(posted) or posted or None,
+                    "description": description,
+                    "amount": parse_amount(transaction.get("TRNAMT")),
+                }
+            transaction = None
+        elif transaction is not None and not tag.startswith("/") and value:
+            transaction[tag] = value
+
+
+def to_expense(transaction):
+    """The transaction as a ledger expense (spending positive), or None for money in.
+
+    Credits (income, refunds, transfers in) aren't spending, so they would
+    only offset it in the rollups.
+    """
+    amount = transaction.get("amount")
+    if amount is not None and amount > 0:
+        return None
+    return dict(transaction, amount=-amount if amount else amount)
+
+
+def detect_format(first_chunk):
+    head = first_chunk[:4096].lstrip().upper()
+    if head.startswith("OFXHEADER") or "<OFX>" in head or "<?OFX" in head:
+        return "ofx"
+    return "csv"
+
+
+def parse_statement(stream, fmt=None):
+    """Yields transactions from a CSV or OFX/QFX binary stream.
+
+    The format is sniffed from the first chunk unless `fmt` is given.
+    """
+    chunks = read_chunks(stream)
+    first = next(chunks, "")
+    if not first:
+        return
+    fmt = (fmt or detect_format(first)).lower()
+    if fmt in ("ofx", "qfx"):
+        yield from parse_ofx(chain([first], chunks))
+    elif fmt == "csv":
+        yield from parse_csv(chain([first], chunks))
+    else:
+        raise StatementError(f"Unsupported statement format: {fmt}")
@@ -2,6 +2,7 @@
 const categorizeBtn = document.getElementById('categorize-btn');
 const queryBtn = document.getElementById('query-btn');
 const expenseInput = document.getElementById('expense-input');
+const statementInput = document.getElementById('statement-input');
 const queryInput = document.getElementById('query-input');
 const chatContainer = document.getElementById('chat-container');
 const queryChatContainer = document.getElementById('query-chat-container');
@@ -13,6 +14,11 @@ const apiStatusText = document.getElementById('api-status-text');
 const tabBtns = document.querySelectorAll('.tab-btn');
 const tabContents = document.querySelectorAll('.tab-content');
 
+// Keyword rules from /api/rules (see categorizer.py), used to categorize clear-cut
+// descriptions without a round trip; null until loaded
+const rulesUrl = document.currentScript ? document.currentScript.dataset.rulesUrl : null;
+let categoryRules = null;
+
 // Chat history
 let chatHistory = JSON.parse(localStorage.getItem('chatHistory')) || [];
 
@@ -22,6 +28,7 @@ document.addEventListener('DOMContentLoaded', () => {
     loadThemePreference();
     updateChatHistorySidebar();
     checkApiStatus();
+    loadCategoryRules();
 });
 
 function setupEventListeners() {
@@ -32,6 +39,16 @@ function setupEventListeners() {
         });
     }
     
+    // Statement file chosen
+    if (statementInput) {
+        statementInput.addEventListener('change', () => {
+            if (statementInput.files.length) {
+                importStatement(statementInput.files[0]);
+                statementInput.value = '';
+            }
+        });
+    }
+    
     // Query button click
     if (queryBtn) {
         queryBtn.addEventListener('click', () => {
@@ -127,11 +144,13 @@ async function checkApiStatus() {
         
         if (data.status === 'online') {
             apiStatusIndicator.classList.add('status-online');
-            apiStatusText.textContent = data.api_available 
-                ? 'AI API connected' 
-                : 'Online (offline mode)';
+            // upstream_healthy comes from the server's background probe of Mistral
+            const healthy = data.upstream_healthy !== undefined ? data.upstream_healthy : data.api_available;
+            apiStatusText.textContent = !data.api_available
+                ? 'Online (offline mode)'
+                : healthy ? 'AI API connected' : 'AI API degraded (using local rules)';
                 
-            if (!data.api_available) {
+            if (!healthy) {
                 apiStatusIndicator.classList.add('status-offline');
             }
         } else {
@@ -145,6 +164,44 @@ async function checkApiStatus() {
     }
 }
 
+// Fetches the server's keyword rules; until they arrive every description goes to the server
+async function loadCategoryRules() {
+    if (!rulesUrl) return;
+    try {
+        const response = await fetch(rulesUrl);
+        if (!response.ok) return;
+        const rules = await response.json();
+        categoryRules = { ...rules, regex: new RegExp(rules.pattern, 'g') };
+    } catch (error) {
+        console.error('Error loading category rules:', error);
+    }
+}
+
+// Mirrors KeywordMatcher.match in categorizer.py; returns { category, confident } or null.
+// A match is confident when its best keyword is strong and no other category matched a strong one.
+function matchCategoryRules(description) {
+    if (!categoryRules) return null;
+    const strengths = new Map();
+    let best = null;
+    for (const match of description.toLowerCase().matchAll(categoryRules.regex)) {
+        const keyword = match[1];
+        const hit = categoryRules.keywords[keyword] || categoryRules.keywords[keyword.split(/\s+/).join(' ')];
+        if (!hit) continue;
+        const [index, strength] = hit;
+        strengths.set(index, Math.max(strengths.get(index) || 0, strength));
+        // Stronger keywords win; ties go to the category listed first
+        if (!best || strength > best[1] || (strength === best[1] && index < best[0])) {
+            best = hit;
+        }
+    }
+    if (!best) return null;
+    const contested = [...strengths].some(([index, strength]) => index !== best[0] && strength >= categoryRules.strong);
+    return {
+        category: categoryRules.categories[best[0]],
+        confident: best[1] >= categoryRules.strong && !contested
+    };
+}
+
 // Function to categorize expense
 async function categorizeExpense() {
     const description = expenseInput.value.trim();
@@ -157,6 +214,16 @@ async function categorizeExpense() {
     // Add user message to chat
     addMessage(description, 'user', chatContainer);
     
+    // Clear-cut descriptions are answered here; only ambiguous ones go to the server.
+    // A server with a merchant dictionary consults it before the rules, so it always gets asked.
+    const localMatch = categoryRules && !categoryRules.merchants ? matchCategoryRules(description) : null;
+    if (localMatch && localMatch.confident) {
+        addMessage(`I've categorized this as: <span class="category-tag tag-${localMatch.category}">${localMatch.category}</span>`, 'bot', chatContainer, true);
+        saveChatItem(description, localMatch.category, 'category');
+        expenseInput.value = '';
+        return;
+    }
+    
     // Show loading indicator
     const loadingMessage = document.createElement('div');
     loadingMessage.className = 'chat-message bot-message';
@@ -210,8 +277,75 @@ async function categorizeExpense() {
     }
 }
 
+// Function to import a bank statement; results stream back as NDJSON while it uploads
+async function importStatement(file) {
+    addMessage(`Import ${file.name}`, 'user', chatContainer);
+    const messageElement = addMessage('Importing...', 'bot', chatContainer);
+    const messageText = messageElement.querySelector('.message-text');
+    
+    const counts = {};
+    let imported = 0;
+    
+    const renderSummary = (status) => {
+        const tags = Object.entries(counts)
+            .sort((a, b) => b[1] - a[1])
+            .map(([category, count]) => `<span class="category-tag tag-${category}">${category} ${count}</span>`)
+            .join('');
+        messageText.innerHTML = `<div>${escapeHTML(status)}</div><div class="import-summary">${tags}</div>`;
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    };
+    
+    try {
+        const response = await fetch(`/api/import?filename=${encodeURIComponent(file.name)}`, {
+            method: 'POST',
+            body: file
+        });
+        
+        if (!response.ok || !response.body) {
+            throw new Error(`Import failed with status ${response.status}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            
+            lines.filter(line => line.trim()).forEach(line => {
+                const row = JSON.parse(line);
+                if (row.error) {
+                    throw new Error(row.error);
+                }
+                if (row.category) {
+                    counts[row.category] = (counts[row.category] || 0) + 1;
+                    imported++;
+                }
+            });
+            renderSummary(`Imported ${imported} transactions...`);
+        }
+        
+        renderSummary(`Imported ${imported} transactions from ${file.name}`);
+        showToast('Statement imported');
+    } catch (error) {
+        console.error('Error importing statement:', error);
+        renderSummary(`Import stopped after ${imported} transactions: ${error.message}`);
+    }
+}
+
 // Default category function (fallback when API is unavailable)
 function getDefaultCategory(description) {
+    if (categoryRules) {
+        const match = matchCategoryRules(description);
+        return match ? match.category : 'other';
+    }
+    
+    // The server's rules didn't load; use a built-in subset
     const desc = description.toLowerCase();
     
     if (desc.includes('restaurant') || desc.includes('food') || desc.includes('dinner') || 
@@ -269,7 +403,7 @@ async function sendQuery() {
     queryChatContainer.appendChild(loadingMessage);
     
     try {
-        const response = await fetch('/api/query', {
+        const response = await fetch('/api/query/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -277,32 +411,79 @@ async function sendQuery() {
             body: JSON.stringify({ query })
         });
         
-        const data = await response.json();
+        if (!response.ok || !response.body) {
+            throw new Error(`Query stream failed with status ${response.status}`);
+        }
         
-        // Remove loading message
+        // Replace loading message with a bot message that fills in as tokens arrive
         queryChatContainer.removeChild(loadingMessage);
+        const messageElement = addMessage('', 'bot', queryChatContainer);
+        const messageText = messageElement.querySelector('.message-text');
         
-        if (data.response) {
-            // Add bot response
-            addMessage(data.response, 'bot', queryChatContainer);
-            
+        const answer = await readEventStream(response, (token) => {
+            messageText.textContent += token;
+            queryChatContainer.scrollTop = queryChatContainer.scrollHeight;
+        });
+        
+        if (answer) {
             // Save to history
-            saveChatItem(query, data.response, 'query');
+            saveChatItem(query, answer, 'query');
             
             // Clear input
             queryInput.value = '';
         } else {
-            addMessage('Sorry, I couldn\'t answer that question. Please try again.', 'bot', queryChatContainer);
+            messageText.textContent = 'Sorry, I couldn\'t answer that question. Please try again.';
         }
     } catch (error) {
         // Remove loading message
-        queryChatContainer.removeChild(loadingMessage);
+        if (loadingMessage.parentNode) {
+            queryChatContainer.removeChild(loadingMessage);
+        }
         
         console.error('Error processing query:', error);
         addMessage('There was an error processing your request. Please try again.', 'bot', queryChatContainer);
     }
 }
 
+// Read a Server-Sent Events response, calling onToken for each token; resolves to the full text
+async function readEventStream(response, onToken) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let eventType = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventType = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            
+            if (eventType === 'done') return text;
+            
+            const payload = data ? JSON.parse(data) : {};
+            if (payload.token) {
+                text += payload.token;
+                onToken(payload.token);
+            }
+        }
+    }
+    
+    return text;
+}
+
 // Function to add message to chat
 function addMessage(text, sender, container, isHTML = false) {
     const messageElement = document.createElement('div');
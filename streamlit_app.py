@@ -1,7 +1,28 @@
 import streamlit as st
-import requests
 import os
 import json
+import time
+from collections import deque
+from answer_cache import AnswerCache
+from access_tokens import new_token, token_key
+from chat_history import HistoryRing, HistoryStore
+from categorization_engine import default_engine
+from category_cache import CategoryCache
+from local_model import load_model
+from merchant_dict import load_merchant_dict
+from mistral_client import get_client
+
+# Start of this script run, for the rerun timings shown in the sidebar
+RUN_STARTED = time.perf_counter()
+
+# History entries per sidebar page
+HISTORY_WINDOW = 20
+
+# Entries a session keeps in memory; older ones are dropped
+HISTORY_SIZE = int(os.environ.get("SMARTSPEND_STREAMLIT_HISTORY_SIZE", "200"))
+
+# Cached categorizations and answers expire after this many seconds
+RESULT_TTL = int(os.environ.get("SMARTSPEND_STREAMLIT_RESULT_TTL", "3600"))
 
 # Page configuration
 st.set_page_config(
@@ -15,176 +36,17 @@ st.set_page_config(
 if 'theme' not in st.session_state:
     st.session_state.theme = 'light'
 
-# Apply custom theme CSS
+@st.cache_resource
+def load_dark_theme():
+    """Reads the dark-theme stylesheet once per server process."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "streamlit_dark.css")
+    with open(path, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+# Apply custom theme CSS. Streamlit drops elements a rerun doesn't emit, so the
+# style tag is re-sent each run, but it is read from disk only once.
 if st.session_state.theme == 'dark':
-    st.markdown("""
-    <style>
-    /* MAIN BACKGROUND - Rich deep blue gradient with improved readability */
-    .stApp {
-        background: linear-gradient(140deg, #0f172a 0%, #1e293b 100%);
-    }
-    
-    /* TEXT ELEMENTS - High contrast for better readability */
-    p, div, span, label, li, td, th {
-        color: rgba(255, 255, 255, 0.95) !important;
-        font-weight: 400 !important;
-    }
-    
-    /* HEADINGS - Bold, clear hierarchy with subtle glow */
-    h1 {
-        color: #ffffff !important;
-        font-weight: 700 !important;
-        text-shadow: 0px 2px 3px rgba(0, 0, 0, 0.3);
-        letter-spacing: 0.5px;
-    }
-    
-    h2, h3 {
-        color: #f8fafc !important;
-        font-weight: 600 !important;
-        text-shadow: 0px 1px 2px rgba(0, 0, 0, 0.2);
-    }
-    
-    h4, h5, h6 {
-        color: #f1f5f9 !important;
-        font-weight: 500 !important;
-    }
-    
-    /* LINKS - Vibrant and clearly visible */
-    a {
-        color: #38bdf8 !important;
-        text-decoration: none !important;
-        font-weight: 500 !important;
-    }
-    
-    a:hover {
-        color: #0ea5e9 !important;
-        text-decoration: underline !important;
-    }
-    
-    /* INPUTS - Enhanced contrast with glowing focus state */
-    .stTextInput > div > div > input {
-        background-color: #1e293b !important;
-        color: white !important;
-        border: 1px solid rgba(148, 163, 184, 0.3) !important;
-        border-radius: 6px !important;
-        padding: 10px 14px !important;
-        font-size: 16px !important;
-        transition: all 0.2s ease !important;
-    }
-    
-    .stTextInput > div > div > input:focus {
-        border-color: #38bdf8 !important;
-        box-shadow: 0 0 0 3px rgba(56, 189, 248, 0.3) !important;
-        background-color: #0f172a !important;
-    }
-    
-    /* BUTTONS - Bold gradient with enhanced hover effect */
-    .stButton > button {
-        background: linear-gradient(to right, #0284c7, #38bdf8) !important;
-        color: white !important;
-        font-weight: 600 !important;
-        letter-spacing: 0.3px !important;
-        border: none !important;
-        border-radius: 6px !important;
-        padding: 8px 16px !important;
-        transition: all 0.2s ease !important;
-        box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.2), 0 2px 4px -1px rgba(0, 0, 0, 0.1) !important;
-    }
-    
-    .stButton > button:hover {
-        box-shadow: 0 6px 12px -1px rgba(0, 0, 0, 0.25), 0 3px 6px -1px rgba(0, 0, 0, 0.15) !important;
-        transform: translateY(-2px) !important;
-        background: linear-gradient(to right, #0369a1, #0284c7) !important;
-    }
-    
-    .stButton > button:active {
-        transform: translateY(0px) !important;
-        box-shadow: 0 2px 4px -1px rgba(0, 0, 0, 0.2), 0 1px 2px -1px rgba(0, 0, 0, 0.1) !important;
-    }
-    
-    /* SIDEBAR - Deep rich background with subtle border */
-    [data-testid="stSidebar"] {
-        background-color: #0f172a !important;
-        border-right: 1px solid rgba(148, 163, 184, 0.2) !important;
-    }
-    
-    /* Sidebar heading for better contrast */
-    [data-testid="stSidebar"] h1 {
-        color: #38bdf8 !important;
-    }
-    
-    /* Horizontal rule in sidebar */
-    [data-testid="stSidebar"] hr {
-        border-color: rgba(148, 163, 184, 0.2) !important;
-        margin: 24px 0 !important;
-    }
-    
-    /* ALERT BOXES - Enhanced visibility with clear borders */
-    div.stAlert > div {
-        background-color: #1e293b !important;
-        color: white !important;
-        border: 1px solid rgba(148, 163, 184, 0.2) !important;
-    }
-    
-    /* Better scrollbars for dark mode */
-    ::-webkit-scrollbar {
-        width: 8px;
-        height: 8px;
-    }
-    
-    ::-webkit-scrollbar-track {
-        background: #1e293b;
-    }
-    
-    ::-webkit-scrollbar-thumb {
-        background: #475569;
-        border-radius: 4px;
-    }
-    
-    ::-webkit-scrollbar-thumb:hover {
-        background: #64748b;
-    }
-    
-    /* Category tags with vibrant color coding */
-    .category-tag {
-        display: inline-block;
-        padding: 4px 8px;
-        border-radius: 4px;
-        font-weight: 600;
-        margin-right: 6px;
-        background: rgba(56, 189, 248, 0.2);
-        color: #38bdf8;
-        border: 1px solid rgba(56, 189, 248, 0.3);
-    }
-    
-    /* Tab styling for dark mode */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 1px;
-        background-color: #1e293b !important;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        background-color: #1e293b !important;
-        color: white !important;
-        border-radius: 4px 4px 0 0 !important;
-        margin-right: 2px !important;
-        padding: 10px 16px !important;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background-color: #2563eb !important;
-        color: white !important;
-    }
-    
-    /* Form styling for dark mode */
-    [data-testid="stForm"] {
-        background-color: #1e293b !important;
-        padding: 20px !important;
-        border-radius: 8px !important;
-        border: 1px solid rgba(148, 163, 184, 0.2) !important;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(load_dark_theme(), unsafe_allow_html=True)
 
 # Get API key from environment variable or Streamlit secrets
 MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY", "")
@@ -193,45 +55,36 @@ MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY", "")
 if not MISTRAL_API_KEY and hasattr(st, "secrets"):
     MISTRAL_API_KEY = st.secrets.get("MISTRAL_API_KEY", "")
 
+@st.cache_resource
+def load_client(api_key):
+    """One pooled HTTP client per server process, shared by every session."""
+    return get_client(api_key)
+
+@st.cache_resource
+def load_engine(api_key):
+    """The shared categorization chain, built once per server process.
+    
+    Its cache tier keeps categorizations per normalized description for
+    RESULT_TTL seconds across sessions, so "Uber $12" and "uber $30" share
+    one API call.
+    """
+    fetch = load_client(api_key).categorize if api_key else None
+    return default_engine(fetch, CategoryCache(max_entries=10000, ttl=RESULT_TTL), load_model(),
+                          merchants=load_merchant_dict())
+
 def get_category_from_mistral(description):
-    """Calls Mistral AI API to categorize an expense description."""
-    
-    if not MISTRAL_API_KEY:
+    """Categorizes an expense, asking Mistral only when the local tiers can't."""
+    category, source, reason = load_engine(MISTRAL_API_KEY).categorize(description)
+    if reason == 'offline':
         st.warning("Mistral API key not found. Using local categorization.")
-        return get_default_category(description)
-    
-    try:
-        MISTRAL_ENDPOINT = "https://api.mistral.ai/v1/chat/completions"
-        HEADERS = {
-            "Authorization": f"Bearer {MISTRAL_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "mistral-tiny",
-            "messages": [
-                {"role": "system", "content": "You are an expense categorization assistant. Categorize expenses into one of these categories: food, transportation, housing, utilities, entertainment, shopping, travel, health, education, or other. Reply with just the category name in lowercase."},
-                {"role": "user", "content": f"Categorize this expense: {description}"}
-            ],
-            "temperature": 0.3
-        }
-        response = requests.post(MISTRAL_ENDPOINT, json=payload, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-
-        response_data = response.json()
-        if "choices" in response_data and response_data["choices"]:
-            category = response_data["choices"][0].get("message", {}).get("content", "other").strip().lower()
-            common_categories = ["food", "transportation", "housing", "utilities", "entertainment", 
-                               "shopping", "travel", "health", "education", "other"]
-            for c in common_categories:
-                if c in category:
-                    return c
-            return "other"
+    elif reason:
         st.warning("No valid response from API. Using local categorization.")
-        return get_default_category(description)
-    except Exception as e:
-        st.error(f"Error with API: {str(e)}. Using local categorization.")
-        return get_default_category(description)
+    return category
+
+@st.cache_resource
+def load_answer_cache():
+    """Answers shared by every session for RESULT_TTL seconds, reused for close rephrasings."""
+    return AnswerCache(max_entries=1000, ttl=RESULT_TTL)
 
 def get_query_response(query):
     """Handles general queries via Mistral API."""
@@ -239,89 +92,88 @@ def get_query_response(query):
     if not MISTRAL_API_KEY:
         return "I'm currently in offline mode. For financial advice, please make sure you're tracking your expenses regularly and categorizing them properly to understand your spending patterns."
     
+    answers = load_answer_cache()
+    cached = answers.get(query)
+    if cached is not None:
+        return cached
+    
     try:
-        MISTRAL_ENDPOINT = "https://api.mistral.ai/v1/chat/completions"
-        HEADERS = {
-            "Authorization": f"Bearer {MISTRAL_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": "mistral-tiny",
-            "messages": [
-                {"role": "system", "content": "You are an expense management assistant. Provide helpful, concise responses about expense categories, finance management, and budgeting."},
-                {"role": "user", "content": query}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 150
-        }
-        response = requests.post(MISTRAL_ENDPOINT, json=payload, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-
-        response_data = response.json()
-        if "choices" in response_data and response_data["choices"]:
-            return response_data["choices"][0].get("message", {}).get("content", "").strip()
+        answer = load_client(MISTRAL_API_KEY).answer(query)
+        if answer is not None:
+            answers.set(query, answer)
+            return answer
         return "I couldn't process your query. Please try again."
     except Exception as e:
         st.error(f"Error processing query: {str(e)}")
         return "I'm having trouble connecting to my knowledge base. Please try again later."
 
-def get_default_category(description):
-    """Local fallback categorization when API is unavailable."""
-    desc = description.lower()
-    
-    # Food and Dining
-    if any(keyword in desc for keyword in ["restaurant", "cafe", "coffee", "dinner", "lunch", "breakfast", "meal", "pizza", "burger", "food", "grocery", "groceries", "supermarket"]):
-        return "food"
-    
-    # Transportation
-    if any(keyword in desc for keyword in ["uber", "lyft", "taxi", "car", "gas", "fuel", "bus", "train", "subway", "metro", "transportation", "flight", "airline", "toll"]):
-        return "transportation"
-    
-    # Housing
-    if any(keyword in desc for keyword in ["rent", "mortgage", "apartment", "house", "housing", "property", "real estate", "condo", "maintenance", "repair", "furniture"]):
-        return "housing"
-    
-    # Utilities
-    if any(keyword in desc for keyword in ["electricity", "water", "gas", "internet", "wifi", "phone", "bill", "utility", "utilities", "cable", "subscription"]):
-        return "utilities"
-    
-    # Entertainment
-    if any(keyword in desc for keyword in ["movie", "theater", "concert", "show", "netflix", "spotify", "music", "game", "entertainment", "party", "event", "streaming", "subscription"]):
-        return "entertainment"
-    
-    # Shopping
-    if any(keyword in desc for keyword in ["clothing", "clothes", "shirt", "pants", "shoe", "amazon", "online shopping", "mall", "store", "purchase", "retail", "shopping"]):
-        return "shopping"
-    
-    # Travel
-    if any(keyword in desc for keyword in ["hotel", "airbnb", "vacation", "travel", "trip", "flight", "booking", "resort", "tourism"]):
-        return "travel"
-    
-    # Health
-    if any(keyword in desc for keyword in ["doctor", "medical", "medicine", "healthcare", "pharmacy", "prescription", "hospital", "dental", "gym", "fitness", "health"]):
-        return "health"
-    
-    # Education
-    if any(keyword in desc for keyword in ["tuition", "school", "college", "university", "class", "course", "book", "education", "tutorial", "learning", "training"]):
-        return "education"
-    
-    # Default to "other" if no category matches
-    return "other"
-
 def toggle_theme():
-    """Toggle between light and dark mode."""
+    """Toggle between light and dark mode (as a button callback, so it takes one rerun)."""
     if st.session_state.theme == 'light':
         st.session_state.theme = 'dark'
     else:
         st.session_state.theme = 'light'
-    # Rerun the app with the new theme
-    st.experimental_rerun()
 
-def main():
-    # Initialize chat history if it doesn't exist
+@st.cache_resource
+def load_history_store():
+    """Persistent per-user history, shared by every session; None unless SMARTSPEND_HISTORY_DB is set."""
+    if not os.environ.get("SMARTSPEND_HISTORY_DB"):
+        return None
+    return HistoryStore(max_entries=int(os.environ.get("SMARTSPEND_HISTORY_MAX", "1000")))
+
+def current_history():
+    """The history to read and append to: the stored one for ?history=<token>, else this session's.
+    
+    Without a valid token in the URL a new one is put there, so the page
+    address is the way back to the history. Only someone with the link can
+    read it, which is why the token is random rather than a user name.
+    """
+    store = load_history_store()
+    if store is not None:
+        key = token_key(st.query_params.get("history"))
+        if key is None:
+            token = new_token()
+            st.query_params["history"] = token
+            key = token_key(token)
+        return store.for_user(key)
     if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+        st.session_state.chat_history = HistoryRing(HISTORY_SIZE)
+    return st.session_state.chat_history
+
+def add_to_history(question, answer, kind):
+    current_history().append(question, answer, kind)
+    st.session_state.history_page = 0
+
+def clear_history():
+    current_history().clear()
+    st.session_state.history_page = 0
+    st.session_state.selected_entry = None
+
+def show_history_page(number):
+    st.session_state.history_page = number
+
+def show_history_entry(entry):
+    """Re-shows a past answer; the entry carries it, so nothing is recomputed."""
+    st.session_state.selected_entry = entry
+
+def close_history_entry():
+    st.session_state.selected_entry = None
+
+def record_rerun_time(slot, history_size):
+    """Shows how long this script run took next to the history length, and keeps recent timings."""
+    elapsed_ms = (time.perf_counter() - RUN_STARTED) * 1000
+    timings = st.session_state.setdefault('rerun_timings', deque(maxlen=200))
+    timings.append((history_size, elapsed_ms))
+    recent = sorted(ms for _, ms in timings)
+    slot.caption(f"⏱️ Rerun {elapsed_ms:.1f} ms · median {recent[len(recent) // 2]:.1f} ms over "
+                 f"{len(recent)} runs · {history_size} history entries")
+    if os.environ.get("SMARTSPEND_STREAMLIT_TIMING"):
+        print(json.dumps({"rerun_ms": round(elapsed_ms, 2), "history": history_size}))
+
+def main():
+    history = current_history()
+    st.session_state.setdefault('history_page', 0)
+    st.session_state.setdefault('selected_entry', None)
     
     # Sidebar with application controls
     with st.sidebar:
@@ -334,25 +186,30 @@ def main():
         theme_label = "Switch to Dark Mode" if current_theme == 'light' else "Switch to Light Mode"
         
         # Custom styled button with clearer purpose
-        if st.button(f"{icon} {theme_label}", key="theme_toggle", use_container_width=True):
-            toggle_theme()
+        st.button(f"{icon} {theme_label}", key="theme_toggle", use_container_width=True, on_click=toggle_theme)
         
         st.markdown("---")
         
         # New chat button
-        if st.button("🔄 New Chat", key="new_chat", use_container_width=True):
-            st.session_state.chat_history = []
-            st.experimental_rerun()
+        st.button("🔄 New Chat", key="new_chat", use_container_width=True, on_click=clear_history)
         
-        # Chat history
-        if st.session_state.chat_history:
+        # Chat history, one page of HISTORY_WINDOW entries at a time, so a
+        # rerun costs the same however long the history gets
+        page = st.session_state.history_page
+        entries, has_more = history.page(page, HISTORY_WINDOW)
+        if entries or page:
             st.markdown("### Chat History")
-            for i, chat in enumerate(st.session_state.chat_history):
-                if "question" in chat:
-                    question_preview = chat["question"][:20] + "..." if len(chat["question"]) > 20 else chat["question"]
-                    if st.button(f"🗨️ {question_preview}", key=f"history_{i}", use_container_width=True):
-                        # Display the selected chat
-                        pass
+            for entry in entries:
+                question_preview = entry["question"][:20] + "..." if len(entry["question"]) > 20 else entry["question"]
+                st.button(f"🗨️ {question_preview}", key=f"history_{entry['id']}", use_container_width=True,
+                          on_click=show_history_entry, args=(entry,))
+            if page or has_more:
+                prev_col, next_col = st.columns(2)
+                prev_col.button("← Newer", key="history_newer", use_container_width=True, disabled=page == 0,
+                                on_click=show_history_page, args=(page - 1,))
+                next_col.button("Older →", key="history_older", use_container_width=True, disabled=not has_more,
+                                on_click=show_history_page, args=(page + 1,))
+                st.caption(f"Page {page + 1}")
         else:
             st.info("No chat history yet.")
         
@@ -373,11 +230,23 @@ def main():
         # Credits
         st.markdown("---")
         st.caption("© 2025 SmartSpend #VK | Created By: Vishwas 12306388 | Vikram Singh 12324502 | Debaparkash Jena 12316470")
+        
+        # Filled in at the end of the run
+        timing_slot = st.empty()
 
     # Main Content
     st.title("SmartSpend Assistant")
     st.markdown("AI-powered expense categorization to simplify your financial tracking")
     
+    # A history entry picked in the sidebar
+    selected = st.session_state.selected_entry
+    if selected:
+        with st.container(border=True):
+            label = "Expense" if selected["type"] == "categorization" else "Question"
+            st.success(f"{label}: {selected['question']}")
+            st.info(f"{'Category' if selected['type'] == 'categorization' else 'Answer'}: {selected['answer']}")
+            st.button("Close", key="close_history_entry", on_click=close_history_entry)
+    
     tab1, tab2 = st.tabs(["💬 Expense Categorization", "❓ Finance Questions"])
     
     # Tab 1: Expense Categorization
@@ -421,11 +290,7 @@ def main():
             st.info(f"Category: {category}")
             
             # Add to history
-            st.session_state.chat_history.append({
-                "question": expense_desc,
-                "answer": category,
-                "type": "categorization"
-            })
+            add_to_history(expense_desc, category, "categorization")
     
     # Tab 2: Finance Questions
     with tab2:
@@ -468,11 +333,9 @@ def main():
             st.info(f"Answer: {response}")
             
             # Add to history
-            st.session_state.chat_history.append({
-                "question": query,
-                "answer": response,
-                "type": "query"
-            })
+            add_to_history(query, response, "query")
+    
+    record_rerun_time(timing_slot, history.count())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,84 @@
+import importlib
+import threading
+
+import pytest
+
+from ledger import Ledger
+
+RENT = {"description": "rent", "amount": 900, "date": "2024-05-01", "category": "housing"}
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    # Offline: no Mistral calls, and nothing written outside tmp_path
+    monkeypatch.setenv("MISTRAL_API_KEY", "")
+    monkeypatch.setenv("SMARTSPEND_LEDGER_DB", str(tmp_path / "import.db"))
+    main = importlib.import_module("main")
+    monkeypatch.setattr(main, "ledger", Ledger(str(tmp_path / "ledger.db")))
+    return main
+
+
+@pytest.fixture
+def client(main):
+    return main.app.test_client()
+
+
+def fallback_counts(main):
+    return main.CATEGORIZATIONS._values.get(("fallback",), 0), main.FALLBACKS._values.get(("offline",), 0)
+
+
+def test_ledgers_are_keyed_by_token(client):
+    token = client.post("/api/ledgers").get_json()["token"]
+    assert client.post("/api/expenses", json=RENT, headers={"X-Ledger-Token": token}).status_code == 201
+    assert client.get("/api/expenses").get_json()["expenses"] == []
+    # Query parameters don't choose a ledger
+    assert client.get("/api/expenses?user=" + token).get_json()["expenses"] == []
+    mine = client.get("/api/expenses", headers={"X-Ledger-Token": token}).get_json()["expenses"]
+    assert [e["description"] for e in mine] == ["rent"]
+    assert client.delete(f"/api/expenses/{mine[0]['id']}").status_code == 404
+    assert client.get("/api/expenses", headers={"X-Ledger-Token": "alice"}).status_code == 401
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("post", "/api/expenses", dict(RENT, amount=-50)),
+    ("post", "/api/categorize", {"description": "lunch", "save": True, "amount": -5}),
+    ("patch", "/api/expenses/{id}", {"amount": -5}),
+])
+def test_negative_amounts_are_rejected(client, method, path, body):
+    client.post("/api/expenses", json=RENT)
+    expense_id = client.get("/api/expenses").get_json()["expenses"][0]["id"]
+    response = getattr(client, method)(path.format(id=expense_id), json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Amounts must be positive spending"}
+    assert client.get("/api/summary?year=2024").get_json()["year_to_date"] == \
+        {"housing": {"total": 900.0, "count": 1}}
+
+
+def test_batch_fallbacks_are_counted_by_reason(main, client):
+    before = fallback_counts(main)
+    descriptions = ["qwzx plonk", "vrbb fnord", "glorp snek"]
+    assert client.post("/api/categorize/batch", json={"descriptions": descriptions}).status_code == 200
+    assert client.post("/api/categorize", json={"description": "zorble"}).get_json()["fallback_reason"] == "offline"
+    after = fallback_counts(main)
+    assert (after[0] - before[0], after[1] - before[1]) == (4, 4)
+
+
+def test_single_categorization_does_not_join_a_bulk_flight(main, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def fetch(description, priority):
+        if priority == main.BULK:
+            started.set()
+            release.wait(5)
+            return "shopping"
+        return "food"
+
+    monkeypatch.setattr(main, "_fetch_upstream_category", fetch)
+    bulk = threading.Thread(target=main.fetch_bulk_category, args=("Blue Bottle",))
+    bulk.start()
+    started.wait(5)
+    try:
+        assert main.fetch_upstream_category("BLUE BOTTLE") == "food"
+    finally:
+        release.set()
+        bulk.join()
@@ -0,0 +1,113 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+from ledger import Ledger, buckets, iso_date
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return Ledger(str(tmp_path / "ledger.db"))
+
+
+def expected_summary(ledger, user_id, year):
+    """The summary recomputed from the stored expenses, for comparison with the rollups."""
+    totals = defaultdict(lambda: [0.0, 0])
+    expenses, cursor = ledger.list(user_id, limit=1000)
+    while cursor:
+        page, cursor = ledger.list(user_id, cursor=cursor, limit=1000)
+        expenses += page
+    for expense in expenses:
+        for period, bucket in buckets(expense["date"]):
+            if bucket.startswith(str(year)):
+                entry = totals[(period, bucket, expense["category"])]
+                entry[0] += expense["amount"] or 0.0
+                entry[1] += 1
+    summary = {"year_to_date": {}, "months": {}, "weeks": {}}
+    for (period, bucket, category), (total, count) in totals.items():
+        target = summary["year_to_date"] if period == "year" else summary[period + "s"].setdefault(bucket, {})
+        target[category] = {"total": round(total, 2), "count": count}
+    return summary
+
+
+def test_buckets_come_from_the_parsed_date():
+    assert buckets("2024-05-14") == [("month", "2024-05"), ("week", "2024-W20"), ("year", "2024")]
+    assert buckets("20240514") == buckets("2024-05-14")
+    # ISO week 1 of 2025 starts in December 2024
+    assert buckets("2024-12-30") == [("month", "2024-12"), ("week", "2025-W01"), ("year", "2024")]
+    assert buckets("14/05/2024") == []
+
+
+def test_iso_date_normalizes_and_rejects():
+    assert iso_date("20240514") == "2024-05-14"
+    for value in (None, "", "2024-13-01", "05/14/2024", 20240514):
+        with pytest.raises(ValueError):
+            iso_date(value)
+
+
+def test_dates_are_stored_normalized(ledger):
+    expense_id = ledger.add({"description": "uber", "amount": 5.0, "date": "20240514", "category": "transportation"})
+    assert ledger.get(expense_id)["date"] == "2024-05-14"
+    assert ledger.summary(year=2024)["months"] == {"2024-05": {"transportation": {"total": 5.0, "count": 1}}}
+    with pytest.raises(ValueError):
+        ledger.add({"description": "uber", "amount": 5.0, "date": "someday", "category": "transportation"})
+    with pytest.raises(ValueError):
+        ledger.update(expense_id, {"date": None})
+
+
+def test_update_ignores_source_and_marks_recategorized(ledger):
+    expense_id = ledger.add({"description": "uber", "amount": 5.0, "date": "2024-05-14",
+                             "category": "transportation", "source": "rules"})
+    assert ledger.update(expense_id, {"source": "llm"})["source"] == "rules"
+    assert ledger.update(expense_id, {"category": "travel"})["source"] == "user"
+
+
+def test_rollups_stay_consistent_through_edits(ledger):
+    rng = random.Random(7)
+    categories = ("food", "transportation", "shopping", "travel")
+    days = [f"2024-{month:02d}-{day:02d}" for month in (1, 5, 12) for day in (1, 15, 31 if month != 5 else 30)]
+    days += ["2023-12-31", "2025-01-01"]
+    ids = {"alice": [], "bob": []}
+    for step in range(400):
+        user_id = rng.choice(("alice", "bob"))
+        action = rng.random()
+        if action < 0.5 or not ids[user_id]:
+            expenses = [{"description": f"item {step} {i}", "amount": rng.choice((None, round(rng.uniform(1, 200), 2))),
+                         "date": rng.choice(days), "category": rng.choice(categories)} for i in range(rng.randint(1, 3))]
+            if len(expenses) == 1:
+                ids[user_id].append(ledger.add(expenses[0], user_id))
+            else:
+                ledger.add_many(expenses, user_id)
+                ids[user_id] = [e["id"] for e in ledger.list(user_id, limit=1000)[0]]
+        elif action < 0.8:
+            changes = rng.choice(({"category": rng.choice(categories)}, {"amount": round(rng.uniform(1, 200), 2)},
+                                  {"date": rng.choice(days)}, {"amount": None}))
+            assert ledger.update(rng.choice(ids[user_id]), changes, user_id) is not None
+        else:
+            expense_id = ids[user_id].pop(rng.randrange(len(ids[user_id])))
+            assert ledger.delete(expense_id, user_id) is not None
+
+    assert ledger.rebuild_rollups(check_only=True) == []
+    for user_id in ids:
+        for year in (2023, 2024, 2025):
+            summary = ledger.summary(user_id, year)
+            assert {k: summary[k] for k in ("year_to_date", "months", "weeks")} == \
+                expected_summary(ledger, user_id, year)
+
+
+def test_other_users_cannot_change_an_expense(ledger):
+    expense_id = ledger.add({"description": "rent", "amount": 900.0, "date": "2024-05-01", "category": "housing"},
+                            "alice")
+    assert ledger.update(expense_id, {"category": "food"}, "bob") is None
+    assert ledger.delete(expense_id, "bob") is None
+    assert ledger.summary("bob", 2024)["year_to_date"] == {}
+    assert ledger.summary("alice", 2024)["year_to_date"] == {"housing": {"total": 900.0, "count": 1}}
+
+
+def test_rebuild_repairs_drifted_rollups(ledger):
+    ledger.add({"description": "lunch", "amount": 12.0, "date": "2024-05-01", "category": "food"})
+    ledger._db().execute("UPDATE rollups SET total = total + 1")
+    assert len(ledger.rebuild_rollups(check_only=True)) == 3
+    assert len(ledger.rebuild_rollups()) == 3
+    assert ledger.rebuild_rollups(check_only=True) == []
@@ -0,0 +1,106 @@
+import pytest
+
+from categorization_engine import default_engine
+from merchant_dict import MerchantDictionary, build, load_merchant_dict, merchant_tokens
+
+ROWS = [
+    ("Amazon", "shopping"),
+    ("Amazon Prime Video", "entertainment"),
+    ("AMZN Mktp US", "shopping"),
+    ("Blue Bottle Coffee", "food"),
+    ("Blue Bottle", "food"),
+    ("Uber", "transportation"),
+    ("Uber Eats", "food"),
+    ("Walmart", "shopping"),
+    ("Subway", "food"),
+    ("7-Eleven", "food"),
+    ("McDonald's", "food"),
+    ("Café Zoë", "food"),
+    ("Zzz Sleep Lab", "health"),
+    ("Aaa Insurance", "utilities"),
+    ("Bp", "transportation"),
+    ("Nowhere Inc", "no such category"),
+    ("Walmart", "housing"),
+]
+
+
+@pytest.fixture
+def dictionary(tmp_path):
+    path = str(tmp_path / "merchants.bin")
+    build(ROWS, path)
+    dictionary = MerchantDictionary(path)
+    yield dictionary
+    dictionary.close()
+
+
+def test_merchant_tokens():
+    assert merchant_tokens("SQ *BLUE BOTTLE #12") == ["blue", "bottle"]
+    assert merchant_tokens("POS PURCHASE WALMART 1234") == ["walmart"]
+    assert merchant_tokens("McDonald’s F1234") == ["mcdonalds", "f1234"]
+    # A lone noise word is kept rather than emptying the description
+    assert merchant_tokens("PAYMENT") == ["payment"]
+
+
+@pytest.mark.parametrize("description, expected", [
+    ("AMZN MKTP US*2K3", "shopping"),
+    ("SQ *BLUE BOTTLE #12", "food"),
+    ("Blue Bottle Coffee", "food"),
+    ("UBER *EATS #123", "food"),
+    ("UBER", "transportation"),
+    ("Amazon Prime Video", "entertainment"),
+    ("McDonald's F1234", "food"),
+    ("SUBWAY 00123", "food"),
+    ("7-ELEVEN 123", "food"),
+    ("CAFE ZOE", None),
+    ("Café Zoë #2", "food"),
+    ("ZZZ SLEEP LAB", "health"),
+    ("AAA INSURANCE", "utilities"),
+    ("Blue", None),
+    ("Bluebottle", None),
+    ("nothing here", None),
+    ("", None),
+])
+def test_lookup(dictionary, description, expected):
+    assert dictionary.lookup(description) == expected
+
+
+def test_later_rows_win_and_bad_rows_are_skipped(dictionary):
+    assert dictionary.lookup("WALMART #1234") == "housing"
+    assert dictionary.lookup("NOWHERE INC") is None
+    # Too short to store safely
+    assert dictionary.lookup("BP 12345") is None
+    assert len(dictionary) == 14
+
+
+def test_matches_cover_every_word(dictionary):
+    assert dictionary.lookup("payment to walmart") is None
+    assert dictionary.lookup("lunch at subway") is None
+    assert dictionary.lookup("Subway ride to work") is None
+    assert dictionary.lookup("Blue Bottle Coffee Oakland") is None
+    assert dictionary.lookup("amazon.com order") is None
+    assert dictionary.lookup("PAYMENT WALMART") == "housing"
+
+
+def test_merchants_answer_before_the_keyword_rules(dictionary):
+    engine = default_engine(merchants=dictionary)
+    assert engine.categorize("UBER *EATS #123")[:2] == ("food", "merchants")
+    assert engine.categorize("SUBWAY 00123")[:2] == ("food", "merchants")
+    # Free text naming a merchant is still the rules' to answer
+    assert engine.categorize("Subway ride to work")[:2] == ("transportation", "rules")
+    assert engine.categorize("Uber trip to the airport")[:2] == ("transportation", "rules")
+
+
+def test_close(tmp_path):
+    path = str(tmp_path / "merchants.bin")
+    build(ROWS, path)
+    dictionary = MerchantDictionary(path)
+    dictionary.close()
+    with pytest.raises(ValueError):
+        dictionary.lookup("walmart")
+
+
+def test_load_merchant_dict(tmp_path):
+    assert load_merchant_dict(str(tmp_path / "missing.bin")) is None
+    bad = tmp_path / "bad.bin"
+    bad.write_bytes(b"not a dictionary")
+    assert load_merchant_dict(str(bad)) is None
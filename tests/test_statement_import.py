@@ -0,0 +1,109 @@
+import csv
+import io
+
+import pytest
+
+import statement_import
+from statement_import import StatementError, parse_amount, parse_date, parse_statement, to_expense
+
+
+def parse(text, fmt=None):
+    return list(parse_statement(io.BytesIO(text.encode("utf-8")), fmt))
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("12.50", 12.5),
+    ("-12.50", -12.5),
+    ("$1,234.56", 1234.56),
+    ("(12.00)", -12.0),
+    ("1.234,56", 1234.56),
+    ("- € 3,5", -3.5),
+    ("", None),
+    ("n/a", None),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-05-14", "2024-05-14"),
+    ("05/14/2024", "2024-05-14"),
+    ("14.05.2024", "2024-05-14"),
+    ("20240514", "2024-05-14"),
+    ("14 May 2024", "2024-05-14"),
+    ("someday", None),
+])
+def test_parse_date(value, expected):
+    assert parse_date(value) == expected
+
+
+def test_csv_with_header():
+    rows = parse("Date,Description,Amount\n2024-05-01,UBER TRIP,-12.50\n05/02/2024,\"ACME, INC PAYROLL\",3000\n")
+    assert rows == [
+        {"date": "2024-05-01", "description": "UBER TRIP", "amount": -12.5},
+        {"date": "2024-05-02", "description": "ACME, INC PAYROLL", "amount": 3000.0},
+    ]
+
+
+def test_csv_debit_and_credit_columns():
+    rows = parse("Posted Date;Narrative;Money Out;Money In\n01.05.2024;TESCO;12,50;\n02.05.2024;SALARY;;3000,00\n")
+    assert [row["amount"] for row in rows] == [-12.5, 3000.0]
+
+
+def test_csv_without_header_infers_columns():
+    rows = parse("2024-05-01,-4.20,STARBUCKS STORE 123\n2024-05-02,-9.99,NETFLIX.COM\n")
+    assert rows == [
+        {"date": "2024-05-01", "description": "STARBUCKS STORE 123", "amount": -4.2},
+        {"date": "2024-05-02", "description": "NETFLIX.COM", "amount": -9.99},
+    ]
+
+
+def test_csv_keeps_unparsed_dates_and_skips_blank_descriptions():
+    rows = parse("Date,Description,Amount\nsomeday,LYFT,-3\n2024-05-01,,-1\n")
+    assert rows == [{"date": "someday", "description": "LYFT", "amount": -3.0}]
+
+
+def test_csv_split_across_read_chunks(monkeypatch):
+    monkeypatch.setattr(statement_import, "CHUNK_SIZE", 7)
+    text = "Date,Description,Amount\n" + "".join(f"2024-05-{d:02d},CAFÉ {d},-{d}.25\r\n" for d in range(1, 29))
+    rows = parse(text)
+    assert len(rows) == 28
+    assert rows[-1] == {"date": "2024-05-28", "description": "CAFÉ 28", "amount": -28.25}
+
+
+def test_csv_errors_propagate():
+    with pytest.raises(csv.Error):
+        parse("Date,Description,Amount\n2024-05-01,\"" + "x" * (csv.field_size_limit() + 1) + "\",-1\n")
+    with pytest.raises(StatementError):
+        parse("12.50,2024-05-01\n")
+    with pytest.raises(StatementError):
+        parse("anything", fmt="xls")
+
+
+OFX_SGML = """OFXHEADER:100
+DATA:OFXSGML
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240501120000<TRNAMT>-12.50<NAME>UBER<MEMO>TRIP HELP.UBER.COM</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240502<TRNAMT>3000.00<NAME>PAYROLL</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+OFX_XML = """<?xml version="1.0"?><?OFX OFXHEADER="200" VERSION="220"?>
+<OFX><BANKTRANLIST>
+<STMTTRN><DTPOSTED>20240503</DTPOSTED><TRNAMT>-4.00</TRNAMT><MEMO>STARBUCKS</MEMO></STMTTRN>
+</BANKTRANLIST></OFX>
+"""
+
+
+def test_ofx_sgml_and_xml():
+    assert parse(OFX_SGML) == [
+        {"date": "2024-05-01", "description": "UBER TRIP HELP.UBER.COM", "amount": -12.5},
+        {"date": "2024-05-02", "description": "PAYROLL", "amount": 3000.0},
+    ]
+    assert parse(OFX_XML) == [{"date": "2024-05-03", "description": "STARBUCKS", "amount": -4.0}]
+
+
+def test_to_expense_saves_spending_as_positive():
+    assert to_expense({"description": "UBER", "amount": -12.5})["amount"] == 12.5
+    assert to_expense({"description": "FEE", "amount": None})["amount"] is None
+    assert to_expense({"description": "SALARY", "amount": 3000.0}) is None
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+
+class HealthProber:
+    """Measures upstream health in a background thread, so readers never wait on it.
+
+    Every `interval` seconds a daemon thread calls `probe()`, which returns
+    (ok, seconds): whether the upstream answered properly and how long the
+    request itself took (None to leave the latency out). It returns None when
+    no request could be sent (e.g. our own queue was full), which says
+    nothing about the upstream; raising counts as a failure. Each outcome
+    updates an exponentially weighted moving average (weight `alpha` for the
+    newest sample) of the error rate, and of the latency of successful probes.
+    unavailable() turns those numbers into a reason to skip the upstream:
+    "upstream_unhealthy" once the error rate passes `max_error_rate`, or
+    "upstream_slow" once the latency passes `max_latency` seconds (0 turns
+    the latency check off).
+    """
+
+    def __init__(self, probe, interval=15.0, alpha=0.3, max_error_rate=0.5, max_latency=0.0):
+        self.probe = probe
+        self.interval = interval
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self._lock = threading.Lock()
+        self._pid = None
+        self._latency = None
+        self._error_rate = 0.0
+        self._last_success = None
+        self._last_failure = None
+        self._last_error = None
+        self._stats = {"probes": 0, "failures": 0, "skipped": 0}
+
+    def start(self):
+        """Starts the probe thread in this process (unavailable() also starts it on first use)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return self
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, daemon=True, name="upstream-health").start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                sample = self.probe()
+            except Exception as e:
+                sample = (False, None, str(e))
+            if sample is None:
+                with self._lock:
+                    self._stats["skipped"] += 1
+            else:
+                self.record(*sample)
+            time.sleep(self.interval)
+
+    def record(self, ok, seconds, error=None):
+        """Folds one upstream call into the averages; `seconds` may be None."""
+        with self._lock:
+            self._stats["probes"] += 1
+            self._error_rate += self.alpha * ((0.0 if ok else 1.0) - self._error_rate)
+            if ok:
+                # Failures often return early (or time out), so they'd skew the latency
+                if seconds is not None and self._latency is None:
+                    self._latency = seconds
+                elif seconds is not None:
+                    self._latency += self.alpha * (seconds - self._latency)
+                self._last_success = time.time()
+            else:
+                self._stats["failures"] += 1
+                self._last_failure = time.time()
+                self._last_error = error
+
+    def unavailable(self):
+        """Why the upstream should be skipped right now, or None if it looks healthy."""
+        if self._pid != os.getpid():
+            # First use in this process, e.g. a worker forked from a preloaded parent
+            self.start()
+        with self._lock:
+            if self._error_rate > self.max_error_rate:
+                return "upstream_unhealthy"
+            if self.max_latency and self._latency is not None and self._latency > self.max_latency:
+                return "upstream_slow"
+            return None
+
+    def stats(self):
+        reason = self.unavailable()
+        with self._lock:
+            return dict(
+                self._stats,
+                healthy=reason is None,
+                reason=reason,
+                ewma_latency_ms=round(self._latency * 1000, 1) if self._latency is not None else None,
+                error_rate=round(self._error_rate, 4),
+                last_success=self._last_success,
+                last_failure=self._last_failure,
+                last_error=self._last_error,
+                interval=self.interval,
+            )
+
+
+def prober_from_env(probe, max_latency=0.0):
+    """Builds a prober from SMARTSPEND_HEALTH_INTERVAL, _ALPHA, _MAX_ERROR_RATE and _MAX_LATENCY."""
+    return HealthProber(
+        probe,
+        interval=float(os.environ.get("SMARTSPEND_HEALTH_INTERVAL", "15")),
+        alpha=float(os.environ.get("SMARTSPEND_HEALTH_ALPHA", "0.3")),
+        max_error_rate=float(os.environ.get("SMARTSPEND_HEALTH_MAX_ERROR_RATE", "0.5")),
+        max_latency=float(os.environ.get("SMARTSPEND_HEALTH_MAX_LATENCY", str(max_latency)))
+    )
@@ -0,0 +1,172 @@
+"""Client-side rate limiting, prioritization and retries for Mistral calls.
+
+Callers queue for a token from a token bucket sized to the account's rate
+limit; the queue is ordered by priority (single categorizations, then
+free-form queries, then bulk categorizations from batches and imports) and
+then by arrival. A 429 or 5xx reply is retried with exponential
+backoff and full jitter, or after the server's Retry-After, as long as the
+caller's deadline allows. A Retry-After pauses the whole bucket, since the
+limit is per account rather than per request.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+CATEGORIZE = 0
+QUERY = 1
+BULK = 2
+PROBE = 3
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call could not be made (or retried) before its deadline."""
+
+
+def retry_after_seconds(response):
+    """Returns the Retry-After delay of a response in seconds, or None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """True for 429 and 5xx replies."""
+    if not isinstance(error, requests.HTTPError) or error.response is None:
+        return False
+    status = error.response.status_code
+    return status == 429 or status >= 500
+
+
+def is_throttled(error):
+    """True for a 429 reply: the upstream is up, it is only rate limiting us."""
+    return isinstance(error, requests.HTTPError) and error.response is not None and \
+        error.response.status_code == 429
+
+
+class UpstreamScheduler:
+    """Token bucket plus priority queue in front of upstream calls.
+
+    `rate` is requests per second (0 disables the bucket, leaving only
+    retries and Retry-After pauses) and `burst` the bucket size.
+    """
+
+    def __init__(self, rate=0.0, burst=None, max_retries=3, base_backoff=0.25, max_backoff=8.0):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._stats = {"calls": 0, "retries": 0, "throttled": 0, "deadline_exceeded": 0}
+
+    def _wait_time(self, now):
+        """Seconds until the head of the queue may go; caller must hold the lock."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if not self.rate:
+            return 0.0
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def acquire(self, priority, deadline):
+        """Blocks until this caller may send a request; raises DeadlineExceeded at `deadline`."""
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._waiting[0] == ticket:
+                        wait = self._wait_time(now)
+                        if wait <= 0:
+                            heapq.heappop(self._waiting)
+                            if self.rate:
+                                self._tokens -= 1
+                            self._cond.notify_all()
+                            return
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["deadline_exceeded"] += 1
+                        raise DeadlineExceeded("Upstream call queued past its deadline")
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def _backoff(self, attempt, error, deadline):
+        """Sleeps before a retry, or raises DeadlineExceeded if that would pass the deadline."""
+        delay = retry_after_seconds(error.response)
+        if delay is not None:
+            with self._cond:
+                self._stats["throttled"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        else:
+            delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            with self._cond:
+                self._stats["deadline_exceeded"] += 1
+            raise DeadlineExceeded(f"Upstream kept failing ({str(error)})") from error
+        with self._cond:
+            self._stats["retries"] += 1
+        time.sleep(delay)
+
+    def call(self, fn, *args, priority=CATEGORIZE, timeout=10.0):
+        """Runs fn(*args) once a token is free, retrying 429/5xx until `timeout` seconds have passed."""
+        deadline = time.monotonic() + timeout
+        for attempt in itertools.count():
+            self.acquire(priority, deadline)
+            with self._cond:
+                self._stats["calls"] += 1
+            try:
+                return fn(*args)
+            except requests.HTTPError as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                self._backoff(attempt, e, deadline)
+
+    def stream(self, fn, *args, priority=QUERY, timeout=10.0):
+        """Like call() for a generator function; only retries failures before the first item."""
+        deadline = time.monotonic() + timeout
+        for attempt in itertools.count():
+            self.acquire(priority, deadline)
+            with self._cond:
+                self._stats["calls"] += 1
+            started = False
+            try:
+                for item in fn(*args):
+                    started = True
+                    yield item
+                return
+            except requests.HTTPError as e:
+                if started or not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                self._backoff(attempt, e, deadline)
+
+    def stats(self):
+        with self._cond:
+            paused_for = max(0.0, self._paused_until - time.monotonic())
+            return dict(self._stats, queued=len(self._waiting), rate=self.rate, burst=self.burst,
+                        paused_for=round(paused_for, 3))